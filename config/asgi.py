@@ -3,6 +3,8 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Запуск: uvicorn config.asgi:application. Асинхронные эндпоинты - main/async_views.py.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -3,8 +3,9 @@ from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
 from celery.schedules import crontab
+from django.conf import settings
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'your_project.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 app = Celery('your_project')
 app.config_from_object('django.conf:settings', namespace='CELERY')
@@ -13,7 +14,11 @@ app.autodiscover_tasks()
 # Планировщик для проверки розыгрышей каждую минуту
 app.conf.beat_schedule = {
     'check-giveaways-every-minute': {
-        'task': 'giveaway.tasks.check_scheduled_giveaways',
+        'task': 'main.tasks.check_scheduled_giveaways',
         'schedule': crontab(minute='*'),
     },
+    'flush-join-buffers': {
+        'task': 'main.tasks.flush_join_buffers',
+        'schedule': settings.JOIN_BUFFER_FLUSH_INTERVAL,
+    },
 }
\ No newline at end of file
@@ -31,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.ProfilingMiddleware',  # первым, чтобы мерить весь запрос
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -60,18 +61,74 @@ TEMPLATES = [
     },
 ]
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# БД: Postgres, если DB_ENGINE=postgres, иначе SQLite
+if os.environ.get('DB_ENGINE') == 'postgres':
+    DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'giveaway'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # С пулом соединения отдает psycopg_pool, постоянные соединения Django несовместимы с ним
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                },
+            } if DB_POOL else {},
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # Файловая тестовая БД: in-memory SQLite не дает потокам ждать блокировку
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+    if os.environ.get('SQLITE_TUNING', 'True') == 'True':
+        DATABASES['default']['OPTIONS'] = {
+            # WAL: читатели не блокируют писателя; NORMAL - fsync только на checkpoint
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            # Блокировка записи берется на BEGIN, а не при первом UPDATE внутри транзакции:
+            # иначе SQLite сразу отвечает "database is locked", не дожидаясь timeout
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(os.environ.get('SQLITE_TIMEOUT', 20)),  # busy_timeout, секунды
+        }
 
 
+# Кеш: Redis, если задан REDIS_URL, иначе память процесса
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'giveaways',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'main.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -82,8 +139,48 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',  # вот сюда добавляется browsable API
-    ]
+    ],
+    # Корзины токенов main.throttling: емкость/период пополнения
+    'DEFAULT_THROTTLE_RATES': {
+        'join_user': os.environ.get('THROTTLE_JOIN_USER', '30/min'),
+        'join_ip': os.environ.get('THROTTLE_JOIN_IP', '120/min'),
+        'join_giveaway': os.environ.get('THROTTLE_JOIN_GIVEAWAY', '1000/s'),
+        'auth_ip': os.environ.get('THROTTLE_AUTH_IP', '20/min'),
+        'verify_ip': os.environ.get('THROTTLE_VERIFY_IP', '30/min'),
+    } if os.environ.get('THROTTLE_ENABLED', 'True') == 'True' else {},
+}
+
+# Хранилище корзин троттлинга: Redis (общий для воркеров) или память процесса
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', os.environ.get('REDIS_URL'))
+THROTTLE_LOCAL_MAXSIZE = int(os.environ.get('THROTTLE_LOCAL_MAXSIZE', 100000))
+
+
+# Хеширование паролей: PASSWORD_HASHER выбирает алгоритм новых хешей,
+# остальные остаются в списке для проверки уже сохраненных паролей
+PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'main.hashers.TunedPBKDF2PasswordHasher',
+    'argon2': 'main.hashers.TunedArgon2PasswordHasher',  # нужен argon2-cffi
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
 }
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASHER
+]
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 1_000_000))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400))  # КиБ
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', 8))
+# Потоков хеширования на процесс: больше ядер смысла нет, остальные ждут в очереди
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+
+
+# Кеш токенов в памяти процесса (main.authentication)
+TOKEN_CACHE_MAXSIZE = int(os.environ.get('TOKEN_CACHE_MAXSIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))  # секунды, задержка отзыва в других воркерах
+
+
+# Доля профилируемых запросов для /api/metrics/ (0 - выключено, 1 - все)
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.1))
 
 
 # CORS настройки
@@ -118,6 +215,19 @@ CORS_ALLOW_HEADERS = [
 # Для PythonAnywhere используем синхронные задачи
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
+# Для воркеров вне eager-режима, например локальный Redis
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+# chord шардированного розыгрыша собирает результаты шардов через backend
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
+# Буфер вступлений (Giveaway.buffered_joins): журнал локального буфера и общий Redis
+JOIN_BUFFER_DIR = os.environ.get('JOIN_BUFFER_DIR', BASE_DIR / 'join_buffer')
+JOIN_BUFFER_REDIS_URL = os.environ.get('JOIN_BUFFER_REDIS_URL', os.environ.get('REDIS_URL'))
+JOIN_BUFFER_FSYNC = os.environ.get('JOIN_BUFFER_FSYNC', 'True') == 'True'
+# Сколько ожидающих вступлений запускает flush, и период flush в beat (секунды)
+JOIN_BUFFER_FLUSH_SIZE = int(os.environ.get('JOIN_BUFFER_FLUSH_SIZE', 500))
+JOIN_BUFFER_FLUSH_INTERVAL = float(os.environ.get('JOIN_BUFFER_FLUSH_INTERVAL', 2))
+# С какого числа участников розыгрыш делится на шарды
+DRAW_SHARD_THRESHOLD = int(os.environ.get('DRAW_SHARD_THRESHOLD', 1_000_000))
 
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
@@ -1,18 +1,28 @@
 from django.contrib import admin
-from .models import Giveaway, Participant, Winner
+from .models import DrawAudit, Giveaway, Participant, PrizeTier, Winner
+
+class PrizeTierInline(admin.TabularInline):
+    model = PrizeTier
+    extra = 0
 
 @admin.register(Giveaway)
 class GiveawayAdmin(admin.ModelAdmin):
-    list_display = ['title', 'join_code', 'draw_time', 'is_active', 'created_by']
+    inlines = [PrizeTierInline]
+    list_display = ['title', 'join_code', 'draw_time', 'is_active', 'participants_count', 'created_by']
     list_filter = ['is_active', 'draw_time']
     search_fields = ['title', 'join_code']
 
 @admin.register(Participant)
 class ParticipantAdmin(admin.ModelAdmin):
-    list_display = ['user', 'giveaway', 'joined_at']
+    list_display = ['user', 'giveaway', 'weight', 'joined_at']
     list_filter = ['giveaway', 'joined_at']
 
 @admin.register(Winner)
 class WinnerAdmin(admin.ModelAdmin):
-    list_display = ['participant', 'giveaway', 'won_at']
-    list_filter = ['giveaway', 'won_at']
\ No newline at end of file
+    list_display = ['participant', 'giveaway', 'tier', 'won_at']
+    list_filter = ['giveaway', 'won_at']
+
+@admin.register(DrawAudit)
+class DrawAuditAdmin(admin.ModelAdmin):
+    list_display = ['giveaway', 'algorithm', 'participants_count', 'created_at']
+    readonly_fields = [field.name for field in DrawAudit._meta.fields]
@@ -0,0 +1,258 @@
+# async_views.py
+"""
+Асинхронные варианты горячих эндпоинтов GiveawayViewSet для ASGI
+(uvicorn config.asgi:application). DRF не поддерживает async-обработчики,
+поэтому это обычные Django-представления на async ORM с авторизацией по токену.
+"""
+import copy
+import json
+import math
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
+
+from .authentication import token_cache
+from .cache import serialize_shared
+from .models import Giveaway, Participant, Winner
+from .serializers import UserRegistrationSerializer
+from .services import (
+    aregister_user, ajoin_giveaway, join_buffer_needs_flush, JOIN_OK, JOIN_QUEUED, JOIN_NOT_FOUND,
+)
+from .tasks import flush_join_buffer
+from .throttling import AuthIPThrottle, JoinGiveawayThrottle, JoinIPThrottle, JoinUserThrottle
+from .views import JOIN_ERRORS
+
+# Размер страницы участников/победителей по умолчанию и максимальный
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+async def aauthenticate(request):
+    """Пользователь по заголовку 'Authorization: Token <key>' или None"""
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) != 2 or parts[0].lower() != 'token':
+        return None
+    key = parts[1]
+
+    cached = token_cache.get(key)
+    if cached is not None:
+        return copy.copy(cached[0])
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    token_cache.set(key, token.user, token)
+    return copy.copy(token.user)
+
+
+def _unauthorized():
+    return JsonResponse({'detail': 'Учетные данные не были предоставлены.'}, status=401)
+
+
+def token_required(view):
+    async def wrapper(request, *args, **kwargs):
+        user = await aauthenticate(request)
+        if user is None:
+            return _unauthorized()
+        request.user = user
+        return await view(request, *args, **kwargs)
+    # Токен вместо сессии - CSRF не нужен
+    return csrf_exempt(wrapper)
+
+
+def _throttled(request, throttle_classes, **kwargs):
+    """Троттлы DRF вне APIView (kwargs - параметры URL): ответ 429 как у DRF или None"""
+    view = SimpleNamespace(kwargs=kwargs)
+    durations = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            durations.append(throttle.wait())
+    if not durations:
+        return None
+    wait = max(durations)
+    return JsonResponse(
+        {'detail': str(Throttled(wait).detail)}, status=429, headers={'Retry-After': str(math.ceil(wait))}
+    )
+
+
+def _isoformat(value):
+    # Как DateTimeField в DRF: локальное время, UTC как 'Z'
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _page_params(request):
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = min(int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return None, None
+    return after, max(limit, 1)
+
+
+def _page_response(request, results, limit):
+    # Курсор - id последней записи страницы
+    next_url = None
+    if len(results) > limit:
+        results = results[:limit]
+        query = request.GET.copy()
+        query['after'] = results[-1]['id']
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return JsonResponse({'next': next_url, 'results': results})
+
+
+@require_GET
+@token_required
+async def giveaway_detail(request, pk):
+    try:
+        giveaway = await Giveaway.objects.select_related('created_by').aget(pk=pk, is_active=True)
+    except Giveaway.DoesNotExist:
+        return JsonResponse({'detail': 'Страница не найдена.'}, status=404)
+
+    data = serialize_shared(giveaway)
+    data['is_creator'] = giveaway.created_by_id == request.user.id
+    data['is_joined'] = await Participant.objects.filter(giveaway_id=pk, user=request.user).aexists()
+    return JsonResponse(data)
+
+
+def _request_flush(giveaway_id):
+    if join_buffer_needs_flush(giveaway_id):
+        flush_join_buffer.delay(giveaway_id)
+
+
+@csrf_exempt
+@require_POST
+async def giveaway_enter(request, pk):
+    """Вступление как GiveawayViewSet.enter: те же троттлы и режим buffered_joins"""
+    # Как ThrottleFirstMixin: по IP и розыгрышу - до аутентификации
+    throttled = _throttled(request, [JoinIPThrottle, JoinGiveawayThrottle], pk=pk)
+    if throttled is not None:
+        return throttled
+    request.user = await aauthenticate(request)
+    if request.user is None:
+        return _unauthorized()
+    throttled = _throttled(request, [JoinUserThrottle], pk=pk)
+    if throttled is not None:
+        return throttled
+
+    result = await ajoin_giveaway(pk, request.user)
+    if result == JOIN_QUEUED:
+        await sync_to_async(_request_flush)(pk)
+        return JsonResponse({'message': 'Заявка на участие принята!', 'status': result}, status=202)
+    if result == JOIN_OK:
+        return JsonResponse({'message': 'Вы успешно зарегистрированы в розыгрыше!', 'status': result}, status=201)
+    if result == JOIN_NOT_FOUND:
+        return JsonResponse({'detail': 'Страница не найдена.'}, status=404)
+    return JsonResponse({'error': JOIN_ERRORS[result], 'status': result}, status=400)
+
+
+@require_GET
+@token_required
+async def giveaway_participants(request, pk):
+    after, limit = _page_params(request)
+    if limit is None:
+        return JsonResponse({'detail': 'Неверные параметры страницы'}, status=400)
+    if not await Giveaway.objects.filter(pk=pk, is_active=True).aexists():
+        return JsonResponse({'detail': 'Страница не найдена.'}, status=404)
+
+    rows = (
+        Participant.objects.filter(giveaway_id=pk, id__gt=after)
+        .order_by('id')
+        .values('id', 'giveaway_id', 'joined_at', 'weight', 'user_id', 'user__username', 'user__email')[:limit + 1]
+    )
+    results = [
+        {
+            'id': row['id'],
+            'user': {'id': row['user_id'], 'username': row['user__username'], 'email': row['user__email']},
+            'joined_at': _isoformat(row['joined_at']),
+            'weight': row['weight'],
+            'giveaway': row['giveaway_id'],
+        }
+        async for row in rows
+    ]
+    return _page_response(request, results, limit)
+
+
+@require_GET
+@token_required
+async def giveaway_winners(request, pk):
+    after, limit = _page_params(request)
+    if limit is None:
+        return JsonResponse({'detail': 'Неверные параметры страницы'}, status=400)
+    # Победители есть только у завершенных (неактивных) розыгрышей
+    if not await Giveaway.objects.filter(pk=pk).aexists():
+        return JsonResponse({'detail': 'Страница не найдена.'}, status=404)
+
+    rows = (
+        Winner.objects.filter(giveaway_id=pk, id__gt=after)
+        .order_by('id')
+        .values(
+            'id', 'giveaway_id', 'won_at', 'prize_description', 'tier_id', 'participant_id', 'participant__joined_at',
+            'participant__weight', 'participant__user_id', 'participant__user__username', 'participant__user__email',
+        )[:limit + 1]
+    )
+    results = [
+        {
+            'id': row['id'],
+            'participant': {
+                'id': row['participant_id'],
+                'user': {
+                    'id': row['participant__user_id'],
+                    'username': row['participant__user__username'],
+                    'email': row['participant__user__email'],
+                },
+                'joined_at': _isoformat(row['participant__joined_at']),
+                'weight': row['participant__weight'],
+                'giveaway': row['giveaway_id'],
+            },
+            'won_at': _isoformat(row['won_at']),
+            'prize_description': row['prize_description'],
+            'tier': row['tier_id'],
+            'giveaway': row['giveaway_id'],
+        }
+        async for row in rows
+    ]
+    return _page_response(request, results, limit)
+
+
+@csrf_exempt
+@require_POST
+async def register(request):
+    """Регистрация как UserRegistrationView; хеш пароля считается вне цикла событий"""
+    throttled = _throttled(request, [AuthIPThrottle])
+    if throttled is not None:
+        return throttled
+
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'detail': 'Некорректный JSON'}, status=400)
+    else:
+        payload = request.POST
+    serializer = UserRegistrationSerializer(data=payload)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    data = serializer.validated_data
+    try:
+        user, token = await aregister_user(data['username'], data.get('email', ''), data['password'])
+    except IntegrityError:
+        return JsonResponse({'username': ['A user with that username already exists.']}, status=400)
+    return JsonResponse({
+        'token': token.key,
+        'user_id': user.pk,
+        'username': user.username,
+        'email': user.email,
+        'message': 'User created successfully'
+    }, status=201)
@@ -0,0 +1,6 @@
+"""
+Воспроизводимые бенчмарки API розыгрышей.
+
+Запуск: python manage.py run_benchmarks --output results.json [--baseline old.json]
+Бенчмарки работают на отдельной тестовой БД и не трогают рабочие данные.
+"""
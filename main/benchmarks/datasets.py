@@ -0,0 +1,145 @@
+# datasets.py
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main.cache import invalidate_lists
+from main.models import Giveaway, Participant
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PASSWORD = 'password123'
+# Сколько строк пишется в одной транзакции
+COMMIT_EVERY = 100_000
+# Кеш страниц SQLite на время загрузки (отрицательное значение - в КиБ)
+BULK_LOAD_CACHE_KIB = -262144
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def bulk_load_mode():
+    """
+    На SQLite на время загрузки отключает fsync и журнал на диске.
+    Для синтетических данных это безопасно: при сбое набор просто генерируется заново.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        synchronous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+        cursor.execute('PRAGMA cache_size')
+        cache_size = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous=OFF')
+        cursor.execute(f'PRAGMA cache_size={BULK_LOAD_CACHE_KIB}')
+        cursor.execute('PRAGMA journal_mode=MEMORY')
+        cursor.fetchall()
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+            cursor.fetchall()
+            cursor.execute(f'PRAGMA synchronous={int(synchronous)}')
+            cursor.execute(f'PRAGMA cache_size={int(cache_size)}')
+
+
+def _bulk_insert(model, objects, batch_size):
+    """bulk_create пачками, не больше COMMIT_EVERY строк на транзакцию"""
+    per_transaction = max(COMMIT_EVERY // batch_size, 1)
+    batches = _batched(objects, batch_size)
+    for first in batches:
+        with transaction.atomic():
+            model.objects.bulk_create(first, ignore_conflicts=True)
+            for batch in islice(batches, per_transaction - 1):
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def seed_dataset(users, giveaways, participants_per_giveaway, seed=0, prefix='bench',
+                 batch_size=DEFAULT_BATCH_SIZE, log=None):
+    """
+    Генерирует пользователей, розыгрыши и участников пачками bulk_create.
+    Один и тот же seed дает один и тот же набор данных.
+    bulk_create не вызывает сигналы, поэтому participants_count заполняется сразу.
+    """
+    with bulk_load_mode():
+        result = _seed(users, giveaways, participants_per_giveaway, seed, prefix, batch_size, log or (lambda message: None))
+    # Сигналы не срабатывали - сбрасываем ленту вручную
+    invalidate_lists()
+    return result
+
+
+def _seed(users, giveaways, participants_per_giveaway, seed, prefix, batch_size, log):
+    rng = random.Random(seed)
+    participants_per_giveaway = min(participants_per_giveaway, users)
+    # PBKDF2 считается один раз на весь набор
+    password = make_password(DEFAULT_PASSWORD)
+    now = timezone.now()
+    code_prefix = f'{prefix[:8].upper()}-'
+
+    _bulk_insert(
+        User,
+        (
+            User(username=f'{prefix}_user_{i}', email=f'{prefix}_user_{i}@example.com', password=password)
+            for i in range(users)
+        ),
+        batch_size,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=f'{prefix}_user_').order_by('id').values_list('id', flat=True)
+    )
+    log(f'Пользователи: {len(user_ids)}')
+
+    _bulk_insert(
+        Giveaway,
+        (
+            Giveaway(
+                title=f'{prefix} giveaway {i}',
+                join_code=f'{code_prefix}{i}',
+                draw_time=now + timedelta(days=1, minutes=i),
+                created_by_id=rng.choice(user_ids),
+                winners_count=max(1, participants_per_giveaway // 1000),
+                participants_count=participants_per_giveaway,
+            )
+            for i in range(giveaways)
+        ),
+        batch_size,
+    )
+    giveaway_ids = list(
+        Giveaway.objects.filter(join_code__startswith=code_prefix).order_by('id').values_list('id', flat=True)
+    )
+
+    for number, giveaway_id in enumerate(giveaway_ids, 1):
+        # Сортировка: вставки в индексы по user_id идут подряд, а не вразброс
+        entrants = sorted(rng.sample(user_ids, participants_per_giveaway))
+        _bulk_insert(
+            Participant,
+            (Participant(user_id=user_id, giveaway_id=giveaway_id) for user_id in entrants),
+            batch_size,
+        )
+        log(f'Розыгрыш {number}/{len(giveaway_ids)}: {participants_per_giveaway} участников')
+
+    return {
+        'users': len(user_ids),
+        'giveaways': len(giveaway_ids),
+        'participants': len(giveaway_ids) * participants_per_giveaway,
+        'giveaway_ids': giveaway_ids,
+        'user_ids': user_ids,
+    }
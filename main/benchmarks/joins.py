@@ -0,0 +1,94 @@
+# joins.py
+"""
+Пропускная способность конкурентных вступлений (join_giveaway) для
+разных профилей БД. Профиль - набор переменных окружения для config.settings,
+каждый прогоняется в отдельном процессе.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from main.models import Giveaway
+from main.services import JOIN_OK, join_giveaway
+
+from .scenarios import summarize
+
+PROFILES = {
+    'sqlite-default': {'DB_ENGINE': 'sqlite', 'SQLITE_TUNING': 'False'},
+    'sqlite-wal': {'DB_ENGINE': 'sqlite', 'SQLITE_TUNING': 'True'},
+    'postgres': {'DB_ENGINE': 'postgres', 'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'postgres-no-persistent': {'DB_ENGINE': 'postgres', 'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'postgres-pool': {'DB_ENGINE': 'postgres', 'DB_POOL': 'True'},
+}
+
+
+def run_join_benchmark(threads, joins_per_thread, prefix='joinbench'):
+    """threads потоков вступают в один розыгрыш; после каждого вступления соединение
+    освобождается так же, как в конце HTTP-запроса"""
+    total = threads * joins_per_thread
+    User.objects.bulk_create(
+        (User(username=f'{prefix}_{i}') for i in range(total + 1)), ignore_conflicts=True
+    )
+    user_ids = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id').values_list('id', flat=True))
+    giveaway = Giveaway.objects.create(
+        title='bench joins',
+        join_code=f'JOINS{time.time_ns() % 10 ** 12}',
+        draw_time=timezone.now() + timedelta(days=1),
+        created_by_id=user_ids[-1],
+    )
+    # Потоки откроют свои соединения, текущее не должно держать блокировок
+    connection.close()
+
+    timings, errors, statuses = [], [], {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(ids):
+        local_timings, local_statuses = [], {}
+        barrier.wait()
+        try:
+            for user_id in ids:
+                started = time.perf_counter()
+                try:
+                    result = join_giveaway(giveaway.id, User(id=user_id))
+                except OperationalError as exc:
+                    result = f'error: {exc}'
+                local_timings.append(time.perf_counter() - started)
+                local_statuses[result] = local_statuses.get(result, 0) + 1
+                # Как request_finished: закрыть или вернуть соединение по CONN_MAX_AGE / в пул
+                close_old_connections()
+        except Exception as exc:
+            errors.append(repr(exc))
+        finally:
+            connection.close()
+            with lock:
+                timings.extend(local_timings)
+                for key, count in local_statuses.items():
+                    statuses[key] = statuses.get(key, 0) + count
+
+    chunks = [user_ids[i * joins_per_thread:(i + 1) * joins_per_thread] for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    giveaway.refresh_from_db()
+    result = summarize(timings)
+    result.update({
+        'vendor': connection.vendor,
+        'threads': threads,
+        'joins': total,
+        'elapsed_s': round(elapsed, 3),
+        'joins_per_sec': round(statuses.get(JOIN_OK, 0) / elapsed, 1),
+        'statuses': statuses,
+        'participants_count': giveaway.participants_count,
+        'errors': errors,
+    })
+    return result
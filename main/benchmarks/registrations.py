@@ -0,0 +1,96 @@
+# registrations.py
+"""
+Регистрации в секунду (register_user: хеш пароля + пользователь и токен)
+для разных настроек PASSWORD_HASHERS. Хеширование идет в пуле
+PASSWORD_HASH_WORKERS потоков, поэтому результат на ядро - это
+пропускная способность, деленная на число реально занятых ядер.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import connection
+from django.test.utils import override_settings
+
+from main.services import register_user
+
+from .scenarios import summarize
+
+# Профиль - первый (основной) хешер и его параметры стоимости
+HASHER_PROFILES = {
+    'pbkdf2': {'PASSWORD_HASHERS': ['main.hashers.TunedPBKDF2PasswordHasher']},
+    'pbkdf2-600k': {
+        'PASSWORD_HASHERS': ['main.hashers.TunedPBKDF2PasswordHasher'],
+        'PASSWORD_PBKDF2_ITERATIONS': 600_000,
+    },
+    'argon2': {'PASSWORD_HASHERS': ['main.hashers.TunedArgon2PasswordHasher']},
+    # Минимум OWASP для Argon2id: 19 МиБ, 2 прохода, 1 поток
+    'argon2-19m': {
+        'PASSWORD_HASHERS': ['main.hashers.TunedArgon2PasswordHasher'],
+        'PASSWORD_ARGON2_MEMORY_COST': 19456,
+        'PASSWORD_ARGON2_TIME_COST': 2,
+        'PASSWORD_ARGON2_PARALLELISM': 1,
+    },
+    'scrypt': {'PASSWORD_HASHERS': ['django.contrib.auth.hashers.ScryptPasswordHasher']},
+}
+
+
+def hasher_available(name):
+    """Есть ли библиотека хешера профиля (argon2-cffi не обязателен)"""
+    with override_settings(**HASHER_PROFILES[name]):
+        try:
+            get_hasher().encode('probe', get_hasher().salt())
+        except ValueError:
+            return False
+    return True
+
+
+def run_registration_benchmark(name, threads, registrations):
+    """threads потоков регистрируют registrations пользователей с профилем хешера name"""
+    prefix = f'regbench_{name}_{time.time_ns() % 10 ** 12}'
+    timings, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(indexes):
+        local_timings = []
+        barrier.wait()
+        try:
+            for i in indexes:
+                started = time.perf_counter()
+                register_user(f'{prefix}_{i}', '', 'benchmark-password')
+                local_timings.append(time.perf_counter() - started)
+        except Exception as exc:
+            errors.append(repr(exc))
+        finally:
+            connection.close()
+            with lock:
+                timings.extend(local_timings)
+
+    with override_settings(**HASHER_PROFILES[name]):
+        workers = [
+            threading.Thread(target=worker, args=(range(t, registrations, threads),)) for t in range(threads)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    cores = min(settings.PASSWORD_HASH_WORKERS, os.cpu_count() or 1)
+    per_sec = len(timings) / elapsed if elapsed else 0
+    result = summarize(timings) if timings else {}
+    result.update({
+        'hasher': HASHER_PROFILES[name]['PASSWORD_HASHERS'][0],
+        'threads': threads,
+        'hash_workers': settings.PASSWORD_HASH_WORKERS,
+        'cores': cores,
+        'elapsed_s': round(elapsed, 3),
+        'registrations_per_sec': round(per_sec, 1),
+        'registrations_per_sec_per_core': round(per_sec / cores, 1),
+        'errors': errors,
+    })
+    return result
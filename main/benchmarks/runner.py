@@ -0,0 +1,90 @@
+# runner.py
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings
+
+from .datasets import seed_dataset
+from .scenarios import SCENARIOS, Context
+
+# Наборы данных по умолчанию: (пользователи, розыгрыши, участников на розыгрыш)
+SCALES = {
+    'small': (2_000, 20, 1_000),
+    'medium': (50_000, 50, 20_000),
+    'large': (1_000_000, 20, 1_000_000),
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(users, giveaways, participants_per_giveaway, iterations, seed=0, only=None, log=print):
+    """Генерирует набор данных и прогоняет сценарии; возвращает сериализуемый результат"""
+    log(f'Генерация данных: {users} пользователей, {giveaways} розыгрышей, {participants_per_giveaway} на розыгрыш')
+    dataset = seed_dataset(users, giveaways, participants_per_giveaway, seed=seed)
+    ctx = Context(dataset)
+
+    results = {}
+    # Сценарии шлют запросы с одного адреса, троттлинг отклонял бы их
+    with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}):
+        for name, scenario in SCENARIOS.items():
+            if only and name not in only:
+                continue
+            results[name] = scenario(ctx, iterations)
+            log(f'{name}: {results[name]["median_ms"]} ms (медиана), {results[name]["ops_per_sec"]} оп/с')
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'params': {
+                'users': users,
+                'giveaways': giveaways,
+                'participants_per_giveaway': participants_per_giveaway,
+                'iterations': iterations,
+                'seed': seed,
+            },
+        },
+        'scenarios': results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Сравнивает медианы с базовым прогоном.
+    Регрессия - замедление больше чем на threshold (0.2 = 20%).
+    """
+    regressions = []
+    report = {}
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous['median_ms']:
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        report[name] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return report, regressions
+
+
+def write_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,139 @@
+# scenarios.py
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from main.models import DrawAudit, Giveaway, Winner
+from main.services import flush_buffered_joins, perform_giveaway_draw
+from main.tasks import schedule_giveaway_draw
+
+
+def summarize(timings):
+    """Статистика по длительностям в секундах"""
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    median = statistics.median(ordered)
+    return {
+        'iterations': len(ordered),
+        'median_ms': round(median * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'ops_per_sec': round(1 / median, 1) if median else None,
+    }
+
+
+def measure(action, iterations, before=None):
+    """Время action(i); before(i) выполняется вне замера"""
+    timings = []
+    for i in range(iterations):
+        if before is not None:
+            before(i)
+        started = time.perf_counter()
+        action(i)
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+class Context:
+    """Общие объекты сценариев поверх сгенерированного набора"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.giveaway_id = dataset['giveaway_ids'][0]
+        self.user_ids = dataset['user_ids']
+        token, _ = Token.objects.get_or_create(user_id=self.user_ids[0])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def get(self, url):
+        response = self.client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        return response
+
+
+def scenario_list_cold(ctx, iterations):
+    return measure(lambda i: ctx.get('/api/giveaways/'), iterations, before=lambda i: cache.clear())
+
+
+def scenario_list_warm(ctx, iterations):
+    ctx.get('/api/giveaways/')
+    return measure(lambda i: ctx.get('/api/giveaways/'), iterations)
+
+
+def scenario_retrieve(ctx, iterations):
+    return measure(lambda i: ctx.get(f'/api/giveaways/{ctx.giveaway_id}/'), iterations)
+
+
+def scenario_participants_page(ctx, iterations):
+    return measure(lambda i: ctx.get(f'/api/giveaways/{ctx.giveaway_id}/participants/'), iterations)
+
+
+def scenario_enter(ctx, iterations, buffered=False):
+    """Каждая итерация - новый пользователь в свежем розыгрыше"""
+    giveaway = Giveaway.objects.create(
+        title='bench enter',
+        join_code=f'BENCHENTER{int(time.time() * 1000) % 10 ** 9}',
+        draw_time=timezone.now() + timedelta(days=1),
+        created_by_id=ctx.user_ids[0],
+        buffered_joins=buffered,
+    )
+    expected_status = 202 if buffered else 201
+    clients = []
+    for user_id in ctx.user_ids[:iterations]:
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        clients.append(client)
+
+    def enter(i):
+        response = clients[i].post(f'/api/giveaways/{giveaway.id}/enter/')
+        assert response.status_code == expected_status, response.status_code
+
+    result = measure(enter, min(iterations, len(clients)))
+    if buffered:
+        flush_buffered_joins(giveaway.id)
+    return result
+
+
+def scenario_enter_buffered(ctx, iterations):
+    return scenario_enter(ctx, iterations, buffered=True)
+
+
+def _reset_draw(giveaway_id):
+    Winner.objects.filter(giveaway_id=giveaway_id).delete()
+    DrawAudit.objects.filter(giveaway_id=giveaway_id).delete()
+    Giveaway.objects.filter(pk=giveaway_id).update(is_active=True, draw_time=timezone.now() - timedelta(seconds=1))
+
+
+def scenario_draw_service(ctx, iterations):
+    def draw(i):
+        success, result = perform_giveaway_draw(ctx.giveaway_id)
+        assert success, result
+
+    return measure(draw, iterations, before=lambda i: _reset_draw(ctx.giveaway_id))
+
+
+def scenario_draw_task(ctx, iterations):
+    # При CELERY_TASK_ALWAYS_EAGER задача выполняется синхронно
+    return measure(
+        lambda i: schedule_giveaway_draw.apply(args=(ctx.giveaway_id,)).get(),
+        iterations,
+        before=lambda i: _reset_draw(ctx.giveaway_id),
+    )
+
+
+SCENARIOS = {
+    'list_cold': scenario_list_cold,
+    'list_warm': scenario_list_warm,
+    'retrieve': scenario_retrieve,
+    'participants_page': scenario_participants_page,
+    'enter': scenario_enter,
+    'enter_buffered': scenario_enter_buffered,
+    'draw_service': scenario_draw_service,
+    'draw_task': scenario_draw_task,
+}
@@ -0,0 +1,196 @@
+# servers.py
+"""
+Пропускная способность WSGI (gunicorn gthread) против ASGI (uvicorn) при
+многих одновременных соединениях. Серверы запускаются подпроцессами,
+нагрузку дает asyncio-клиент HTTP/1.1 с keep-alive.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from main.models import Giveaway
+
+from .scenarios import summarize
+
+# Эндпоинты синхронного и асинхронного путей
+ENDPOINTS = {
+    'retrieve': ('GET', '/api/giveaways/{id}/', '/api/async/giveaways/{id}/'),
+    'participants': ('GET', '/api/giveaways/{id}/participants/', '/api/async/giveaways/{id}/participants/'),
+    'enter': ('POST', '/api/giveaways/{id}/enter/', '/api/async/giveaways/{id}/enter/'),
+}
+
+STARTUP_TIMEOUT = 30
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(kind, port, workers, threads):
+    if kind == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'config.wsgi:application', '--worker-class', 'gthread',
+            '--workers', str(workers), '--threads', str(threads), '--bind', f'127.0.0.1:{port}',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'config.asgi:application', '--workers', str(workers),
+        '--host', '127.0.0.1', '--port', str(port), '--no-access-log',
+    ]
+
+
+def start_server(kind, workers, threads):
+    """Запускает сервер и ждет, пока порт начнет принимать соединения"""
+    port = _free_port()
+    process = subprocess.Popen(
+        server_command(kind, port, workers, threads),
+        cwd=settings.BASE_DIR,
+        # Нагрузка идет с одного адреса, троттлинг отклонял бы ее
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings', 'THROTTLE_ENABLED': 'False'},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind}-сервер завершился с кодом {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{kind}-сервер не запустился за {STARTUP_TIMEOUT} с')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get('connection') == 'close'
+
+
+async def _connection(port, requests, timings, statuses):
+    reader = writer = None
+    try:
+        for raw in requests:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            started = time.perf_counter()
+            writer.write(raw)
+            await writer.drain()
+            status, closed = await _read_response(reader)
+            timings.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if closed:
+                writer.close()
+                writer = None
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        statuses['error'] = statuses.get('error', 0) + 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _request(method, path, token, port):
+    return (
+        f'{method} {path} HTTP/1.1\r\n'
+        f'Host: 127.0.0.1:{port}\r\n'
+        f'Authorization: Token {token}\r\n'
+        'Content-Length: 0\r\n'
+        '\r\n'
+    ).encode()
+
+
+async def _load(port, requests, concurrency):
+    timings, statuses = [], {}
+    per_connection = [requests[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(_connection(port, chunk, timings, statuses) for chunk in per_connection if chunk))
+    elapsed = time.perf_counter() - started
+    return timings, statuses, elapsed
+
+
+def run_load(port, requests, concurrency):
+    """Прогоняет готовые HTTP-запросы через concurrency соединений"""
+    timings, statuses, elapsed = asyncio.run(_load(port, requests, concurrency))
+    result = summarize(timings) if timings else {}
+    result.update({
+        'requests': len(requests),
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_sec': round(len(timings) / elapsed, 1) if elapsed else None,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    })
+    return result
+
+
+def _fresh_giveaway(organizer_id, capacity):
+    # Для enter каждому серверу нужен свой пустой розыгрыш
+    return Giveaway.objects.create(
+        title='bench servers enter',
+        join_code=f'SRVENTER{time.time_ns() % 10 ** 12}',
+        draw_time=timezone.now() + timedelta(days=1),
+        created_by_id=organizer_id,
+        max_participants=capacity,
+    )
+
+
+def run_server_benchmarks(dataset, servers, endpoints, requests, concurrency, workers, threads, log=print):
+    """Для каждого сервера и эндпоинта - пропускная способность и задержки"""
+    user_ids = dataset['user_ids']
+    giveaway_id = dataset['giveaway_ids'][0]
+    tokens = [Token.objects.get_or_create(user_id=user_id)[0].key for user_id in user_ids[:requests]]
+
+    results = {}
+    for kind in servers:
+        process, port = start_server(kind, workers, threads)
+        try:
+            for name in endpoints:
+                method, sync_path, async_path = ENDPOINTS[name]
+                path = async_path if kind == 'asgi' else sync_path
+                target = giveaway_id
+                if name == 'enter':
+                    target = _fresh_giveaway(user_ids[0], len(tokens)).id
+                raw = [
+                    _request(method, path.format(id=target), tokens[i % len(tokens)], port)
+                    for i in range(requests)
+                ]
+                result = run_load(port, raw, concurrency)
+                results[f'{kind}:{name}'] = result
+                log(f'{kind} {name}: {result["requests_per_sec"]} запр/с, p95 {result.get("p95_ms")} ms, '
+                    f'статусы {result["statuses"]}')
+        finally:
+            stop_server(process)
+    return results
@@ -0,0 +1,302 @@
+# cache.py
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import Giveaway, Participant, Winner
+
+# Карточка розыгрыша сбрасывается сигналами, TTL - страховка
+GIVEAWAY_CACHE_TIMEOUT = 300
+# Страницы ленты сбрасываются при изменении розыгрышей и победителей.
+# Новые участники ленту не сбрасывают: participants_count в ней может отставать
+# не больше чем на LIST_CACHE_TIMEOUT, иначе каждый вход обнулял бы кеш ленты.
+LIST_CACHE_TIMEOUT = 30
+JOINED_CACHE_TIMEOUT = 300
+# Индекс участий пользователя сбрасывается при вступлении и розыгрыше
+PARTICIPATIONS_CACHE_TIMEOUT = 3600
+# Индекс кодов входа сбрасывается сигналами, TTL - страховка
+CODE_CACHE_TIMEOUT = 3600
+# Проверка розыгрыша сбрасывается вместе с карточкой и при смене DrawAudit
+VERIFY_CACHE_TIMEOUT = 3600
+# Поля розыгрыша в индексе кодов: все, что нужно для входа без чтения строки
+CODE_INDEX_FIELDS = ('id', 'draw_time', 'max_participants', 'is_active', 'buffered_joins')
+
+LIST_VERSION_KEY = 'giveaway:list:version'
+# Индексы участий упорядочены по draw_time: его смена сбрасывает индексы всех пользователей
+PARTICIPATIONS_VERSION_KEY = 'user:participations:version'
+
+# Поля, зависящие от пользователя, в общий кеш не попадают
+USER_FIELDS = ('is_joined', 'is_creator')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(kind, hit, count=1):
+    with _stats_lock:
+        _stats[(kind, 'hits' if hit else 'misses')] += count
+
+
+def get_cache_stats():
+    """Счетчики попаданий/промахов текущего процесса"""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    stats = {}
+    for kind in ('detail', 'list', 'joined', 'code', 'participations', 'verify'):
+        hits = snapshot.get((kind, 'hits'), 0)
+        misses = snapshot.get((kind, 'misses'), 0)
+        total = hits + misses
+        stats[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def giveaway_pk(value):
+    """
+    ID розыгрыша из URL числом или None, если это не число.
+    Ключи кеша строятся только от него: '01' и '1' - один розыгрыш.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _detail_key(giveaway_id):
+    return f'giveaway:{giveaway_id}:data'
+
+
+def _joined_key(giveaway_id, user_id):
+    return f'giveaway:{giveaway_id}:joined:{user_id}'
+
+
+def _participations_key(user_id, version):
+    return f'user:{user_id}:participations:{version}'
+
+
+def _verify_key(giveaway_id):
+    return f'giveaway:{giveaway_id}:verify'
+
+
+def _code_key(join_code):
+    return f'giveaway:code:{join_code}'
+
+
+def _list_version():
+    # Начальное значение от времени: после вытеснения ключа старые страницы не оживут
+    return cache.get_or_set(LIST_VERSION_KEY, time.time_ns, None)
+
+
+def _list_key(url):
+    return f'giveaway:list:{_list_version()}:{url}'
+
+
+def _participations_version():
+    return cache.get_or_set(PARTICIPATIONS_VERSION_KEY, time.time_ns, None)
+
+
+def serialize_shared(giveaway):
+    """Данные розыгрыша без пользовательских полей"""
+    from .serializers import GiveawaySerializer
+
+    data = dict(GiveawaySerializer(giveaway).data)
+    for field in USER_FIELDS:
+        data.pop(field, None)
+    return data
+
+
+def get_giveaway_data(giveaway_id):
+    """Общие поля розыгрыша: из кеша или одной выборкой с организатором"""
+    giveaway_id = giveaway_pk(giveaway_id)
+    if giveaway_id is None:
+        return None
+    key = _detail_key(giveaway_id)
+    data = cache.get(key)
+    _record('detail', data is not None)
+    if data is None:
+        giveaway = Giveaway.objects.with_user_flags(None).filter(pk=giveaway_id).first()
+        if giveaway is None:
+            return None
+        data = serialize_shared(giveaway)
+        cache.set(key, data, GIVEAWAY_CACHE_TIMEOUT)
+    return data
+
+
+def get_giveaways_data(giveaway_ids):
+    """get_giveaway_data для списка ID: один get_many и одна выборка промахов"""
+    keys = {_detail_key(giveaway_id): giveaway_id for giveaway_id in giveaway_ids}
+    cached = cache.get_many(keys)
+    _record('detail', True, len(cached))
+    data = {keys[key]: value for key, value in cached.items()}
+    missing = [giveaway_id for key, giveaway_id in keys.items() if key not in cached]
+    if missing:
+        _record('detail', False, len(missing))
+        fetched = {
+            giveaway.id: serialize_shared(giveaway)
+            for giveaway in Giveaway.objects.with_user_flags(None).filter(pk__in=missing)
+        }
+        cache.set_many({_detail_key(giveaway_id): value for giveaway_id, value in fetched.items()}, GIVEAWAY_CACHE_TIMEOUT)
+        data.update(fetched)
+    # Удаленные розыгрыши пропускаются
+    return [data[giveaway_id] for giveaway_id in giveaway_ids if giveaway_id in data]
+
+
+def get_participation_index(user_id):
+    """
+    Участия пользователя: {'keys': пары (draw_time, ID розыгрыша) по возрастанию -
+    порядок ленты участий, 'won': ID выигранных}. При промахе - одна выборка по
+    индексу Participant(user) с JOIN по первичному ключу Giveaway.
+    """
+    key = _participations_key(user_id, _participations_version())
+    index = cache.get(key)
+    _record('participations', index is not None)
+    if index is None:
+        rows = (
+            Participant.objects.filter(user_id=user_id)
+            .annotate(won=Exists(Winner.objects.filter(participant=OuterRef('pk'))))
+            .order_by('giveaway__draw_time', 'giveaway_id')
+            .values_list('giveaway__draw_time', 'giveaway_id', 'won')
+        )
+        index = {'keys': [], 'won': []}
+        for draw_time, giveaway_id, won in rows:
+            index['keys'].append((draw_time, giveaway_id))
+            if won:
+                index['won'].append(giveaway_id)
+        cache.set(key, index, PARTICIPATIONS_CACHE_TIMEOUT)
+    return index
+
+
+def get_join_code_entry(join_code):
+    """Поля CODE_INDEX_FIELDS розыгрыша по коду входа или None"""
+    key = _code_key(join_code)
+    entry = cache.get(key)
+    _record('code', entry is not None)
+    if entry is None:
+        entry = Giveaway.objects.filter(join_code=join_code).values(*CODE_INDEX_FIELDS).first()
+        if entry is None:
+            return None
+        cache.set(key, entry, CODE_CACHE_TIMEOUT)
+    return entry
+
+
+def get_draw_verification(giveaway_id, verify):
+    """
+    Отчет verify(giveaway_id): повторный проход по участникам - только при промахе.
+    ID не числом передается в verify как None, не кешируясь.
+    """
+    giveaway_id = giveaway_pk(giveaway_id)
+    if giveaway_id is None:
+        return verify(None)
+    key = _verify_key(giveaway_id)
+    report = cache.get(key)
+    _record('verify', report is not None)
+    if report is None:
+        report = verify(giveaway_id)
+        cache.set(key, report, VERIFY_CACHE_TIMEOUT)
+    return report
+
+
+def get_list_page(url, build_page):
+    """Страница ленты по ключу URL; build_page() вызывается только при промахе"""
+    key = _list_key(url)
+    page = cache.get(key)
+    _record('list', page is not None)
+    if page is None:
+        page = build_page()
+        cache.set(key, page, LIST_CACHE_TIMEOUT)
+    return page
+
+
+def get_joined_ids(giveaway_ids, user):
+    """Множество розыгрышей из списка, в которых участвует пользователь"""
+    if not user.is_authenticated or not giveaway_ids:
+        return set()
+    keys = {_joined_key(giveaway_id, user.id): giveaway_id for giveaway_id in giveaway_ids}
+    cached = cache.get_many(keys)
+    _record('joined', True, len(cached))
+
+    joined = {keys[key] for key, value in cached.items() if value}
+    missing = [giveaway_id for key, giveaway_id in keys.items() if key not in cached]
+    if missing:
+        _record('joined', False, len(missing))
+        found = set(
+            Participant.objects.filter(user=user, giveaway_id__in=missing).values_list('giveaway_id', flat=True)
+        )
+        cache.set_many(
+            {_joined_key(giveaway_id, user.id): giveaway_id in found for giveaway_id in missing},
+            JOINED_CACHE_TIMEOUT,
+        )
+        joined |= found
+    return joined
+
+
+def with_user_fields(items, user):
+    """Добавляет is_joined/is_creator к закешированным данным"""
+    joined = get_joined_ids([item['id'] for item in items], user)
+    return [
+        {
+            **item,
+            'is_joined': item['id'] in joined,
+            'is_creator': user.is_authenticated and item['created_by']['id'] == user.id,
+        }
+        for item in items
+    ]
+
+
+def invalidate_lists():
+    """Новая версия ключей ленты; старые страницы вытеснятся по TTL"""
+    try:
+        cache.incr(LIST_VERSION_KEY)
+    except ValueError:
+        cache.set(LIST_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_giveaway(giveaway_id, list_changed=True):
+    # Состав участников входит в проверку розыгрыша
+    cache.delete_many([_detail_key(giveaway_id), _verify_key(giveaway_id)])
+    if list_changed:
+        invalidate_lists()
+
+
+def invalidate_join_code(join_code):
+    cache.delete(_code_key(join_code))
+
+
+def invalidate_participation_indexes(user_ids):
+    version = _participations_version()
+    cache.delete_many([_participations_key(user_id, version) for user_id in user_ids])
+
+
+def invalidate_all_participation_indexes():
+    """Новая версия ключей индексов участий; старые вытеснятся по TTL"""
+    try:
+        cache.incr(PARTICIPATIONS_VERSION_KEY)
+    except ValueError:
+        cache.set(PARTICIPATIONS_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_participation(giveaway_id, user_id):
+    cache.delete_many([_joined_key(giveaway_id, user_id), _participations_key(user_id, _participations_version())])
+    invalidate_giveaway(giveaway_id, list_changed=False)
+
+
+def invalidate_user_participations(user_id, giveaway_ids):
+    """Сброс после удаления пользователя: его участия удалены каскадом без сигналов"""
+    version = _participations_version()
+    cache.delete_many(
+        [_joined_key(giveaway_id, user_id) for giveaway_id in giveaway_ids] + [_participations_key(user_id, version)]
+    )
+    cache.delete_many([key for giveaway_id in giveaway_ids for key in (_detail_key(giveaway_id), _verify_key(giveaway_id))])
+
+
+def invalidate_participations(giveaway_id, user_ids):
+    """Сброс после bulk_create, который не вызывает сигналы"""
+    cache.delete_many([_joined_key(giveaway_id, user_id) for user_id in user_ids])
+    invalidate_participation_indexes(user_ids)
+    invalidate_giveaway(giveaway_id, list_changed=False)
@@ -0,0 +1,197 @@
+# draw.py
+"""
+Выбор победителей с сохраняемым seed.
+
+Случайное число участника u берется из splitmix64(seed ^ participant_id): оно зависит
+только от seed и ID, поэтому розыгрыш воспроизводим по seed и не зависит от порядка
+чтения и числа шардов. Ключ log(u)/вес (Efraimidis-Spirakis), выбираются k наибольших -
+взвешенная выборка без возвращения, при равных весах равномерная.
+
+Шардированный режим: пространство ID участников делится на диапазоны, каждый
+воркер выбирает k наибольших ключей в своем диапазоне, reduce берет k наибольших из всех.
+"""
+import hashlib
+import heapq
+import math
+import secrets
+from itertools import chain
+
+try:
+    import numpy
+except ImportError:  # numpy не обязателен, есть чистый Python
+    numpy = None
+
+from django.db.models import Count, Max, Min
+
+from .models import Participant
+
+# Версия алгоритма в DrawAudit: меняется при любом изменении ключей или дайджеста
+DRAW_ALGORITHM = 'es-splitmix64-v1'
+# seed помещается в PositiveBigIntegerField
+SEED_BITS = 63
+MASK64 = (1 << 64) - 1
+# Участников на шард по умолчанию
+DRAW_SHARD_SIZE = 250_000
+# Размер пачки при чтении участников
+DRAW_CHUNK_SIZE = 10_000
+
+
+def new_seed():
+    return secrets.randbits(SEED_BITS)
+
+
+def splitmix64(value):
+    """Финализатор splitmix64: биекция на 64-битных целых"""
+    z = (value + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def unit_from_hash(value):
+    """Старшие 53 бита хеша -> число строго в (0, 1)"""
+    return ((value >> 11) + 0.5) / 2 ** 53
+
+
+def draw_keys(seed, ids, weights):
+    """Ключи log(u)/вес для пачки ID"""
+    return [
+        math.log(unit_from_hash(splitmix64(seed ^ participant_id))) / weight
+        for participant_id, weight in zip(ids, weights)
+    ]
+
+
+def _draw_keys_numpy(seed, ids, weights):
+    # То же, что draw_keys; переполнение uint64 в numpy - умножение по модулю 2**64
+    z = ids.astype(numpy.uint64) ^ numpy.uint64(seed & MASK64)
+    z = z + numpy.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> numpy.uint64(31))
+    units = ((z >> numpy.uint64(11)).astype(numpy.float64) + 0.5) / 2 ** 53
+    # Логарифм - math.log, как в draw_keys: numpy.log может отличаться на 1 ulp,
+    # и тогда победители зависели бы от того, установлен ли numpy
+    logs = numpy.fromiter(map(math.log, units.tolist()), dtype=numpy.float64, count=len(units))
+    return logs / weights
+
+
+def largest_keys(seed, chunks, k):
+    """
+    k пар (ключ, ID) с наибольшими ключами по потоку пачек строк (ID, вес),
+    в порядке убывания ключа - это порядок последовательного вытягивания.
+    """
+    if k <= 0:
+        for _ in chunks:
+            pass
+        return []
+    if numpy is not None:
+        return _largest_keys_numpy(seed, chunks, k)
+    heap = []  # k наибольших ключей, в вершине - наименьший из них
+    for rows in chunks:
+        ids = [participant_id for participant_id, _ in rows]
+        weights = [weight for _, weight in rows]
+        for key, participant_id in zip(draw_keys(seed, ids, weights), ids):
+            if len(heap) < k:
+                heapq.heappush(heap, (key, participant_id))
+            elif key > heap[0][0]:
+                heapq.heapreplace(heap, (key, participant_id))
+    return sorted(heap, reverse=True)
+
+
+def _largest_keys_numpy(seed, chunks, k):
+    best_ids = numpy.empty(0, dtype=numpy.int64)
+    best_keys = numpy.empty(0, dtype=numpy.float64)
+    for rows in chunks:
+        data = numpy.fromiter(chain.from_iterable(rows), dtype=numpy.int64, count=2 * len(rows)).reshape(-1, 2)
+        keys = _draw_keys_numpy(seed, data[:, 0], data[:, 1])
+        best_ids = numpy.concatenate((best_ids, data[:, 0]))
+        best_keys = numpy.concatenate((best_keys, keys))
+        if len(best_keys) > k:
+            top = numpy.argpartition(best_keys, -k)[-k:]
+            best_ids, best_keys = best_ids[top], best_keys[top]
+    # Как sorted(..., reverse=True) по парам (ключ, ID)
+    order = numpy.lexsort((best_ids, best_keys))[::-1]
+    return list(zip(best_keys[order].tolist(), best_ids[order].tolist()))
+
+
+def merge_shards(shard_results, k):
+    """Reduce: глобальные k наибольших ключей; ID победителей в порядке вытягивания"""
+    pairs = heapq.nlargest(k, (tuple(pair) for result in shard_results for pair in result))
+    return [participant_id for _, participant_id in pairs]
+
+
+def participant_chunks(giveaway_id, lo=None, hi=None):
+    """Пачки строк (ID, вес) в порядке ID; keyset - каждая пачка отдельным запросом по индексу"""
+    queryset = Participant.objects.filter(giveaway_id=giveaway_id).order_by('id')
+    if hi is not None:
+        queryset = queryset.filter(id__lt=hi)
+    after = None if lo is None else lo - 1
+    while True:
+        page = queryset if after is None else queryset.filter(id__gt=after)
+        rows = list(page.values_list('id', 'weight')[:DRAW_CHUNK_SIZE])
+        if rows:
+            yield rows
+        if len(rows) < DRAW_CHUNK_SIZE:
+            return
+        after = rows[-1][0]
+
+
+class ParticipantsDigest:
+    """sha256 по строкам 'ID:вес' всех участников в порядке ID"""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.count = 0
+
+    def update(self, rows):
+        self._hash.update(''.join(f'{participant_id}:{weight}\n' for participant_id, weight in rows).encode())
+        self.count += len(rows)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _digesting(chunks, digest):
+    for rows in chunks:
+        digest.update(rows)
+        yield rows
+
+
+def draw_pass(giveaway_id, seed, k):
+    """Один потоковый проход по участникам: ID победителей и дайджест набора участников"""
+    digest = ParticipantsDigest()
+    pairs = largest_keys(seed, _digesting(participant_chunks(giveaway_id), digest), k)
+    return [participant_id for _, participant_id in pairs], digest
+
+
+def participants_digest(giveaway_id):
+    digest = ParticipantsDigest()
+    for rows in participant_chunks(giveaway_id):
+        digest.update(rows)
+    return digest
+
+
+def participants_snapshot(giveaway_id):
+    """
+    [число участников, максимальный ID]: снимок до рассылки шардов. Вступление
+    увеличивает максимальный ID, удаление уменьшает число - после любого из них
+    снимок в reduce не совпадет.
+    """
+    snapshot = Participant.objects.filter(giveaway_id=giveaway_id).aggregate(count=Count('id'), hi=Max('id'))
+    return [snapshot['count'], snapshot['hi']]
+
+
+def shard_ranges(giveaway_id, participants_count, shard_size=DRAW_SHARD_SIZE):
+    """Полуоткрытые диапазоны [lo, hi) ID участников примерно по shard_size в каждом"""
+    bounds = Participant.objects.filter(giveaway_id=giveaway_id).aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return []
+    lo, hi = bounds['lo'], bounds['hi'] + 1
+    shards = max(1, -(-participants_count // shard_size))
+    step = -(-(hi - lo) // shards)
+    return [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+
+def sample_shard(giveaway_id, seed, k, lo, hi):
+    """Локальная выборка шарда: список [ключ, ID], сериализуемый в JSON"""
+    return [list(pair) for pair in largest_keys(seed, participant_chunks(giveaway_id, lo, hi), k)]
@@ -0,0 +1,77 @@
+# exports.py
+import csv
+import json
+
+from .models import Participant, Winner
+
+# Размер пачки серверного курсора и число строк в одном куске ответа
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_DATASETS = {
+    'participants': (
+        ('participant_id', 'user_id', 'username', 'email', 'joined_at'),
+        lambda giveaway_id: Participant.objects.filter(giveaway_id=giveaway_id).order_by('id').values_list(
+            'id', 'user_id', 'user__username', 'user__email', 'joined_at'
+        ),
+    ),
+    'winners': (
+        ('winner_id', 'participant_id', 'user_id', 'username', 'email', 'won_at', 'prize_description'),
+        lambda giveaway_id: Winner.objects.filter(giveaway_id=giveaway_id).order_by('id').values_list(
+            'id', 'participant_id', 'participant__user_id', 'participant__user__username',
+            'participant__user__email', 'won_at', 'prize_description'
+        ),
+    ),
+}
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+        return value
+
+
+def _iter_rows(dataset, giveaway_id):
+    """Кортежи из values_list по серверному курсору, без моделей и сериализаторов"""
+    _, queryset_factory = EXPORT_DATASETS[dataset]
+    return queryset_factory(giveaway_id).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _format_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def stream_csv(dataset, giveaway_id):
+    header, _ = EXPORT_DATASETS[dataset]
+    writer = csv.writer(_Echo())
+    buffer = [writer.writerow(header)]
+    for row in _iter_rows(dataset, giveaway_id):
+        buffer.append(writer.writerow([_format_value(value) for value in row]))
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_ndjson(dataset, giveaway_id):
+    header, _ = EXPORT_DATASETS[dataset]
+    buffer = []
+    for row in _iter_rows(dataset, giveaway_id):
+        record = dict(zip(header, (_format_value(value) for value in row)))
+        buffer.append(json.dumps(record, ensure_ascii=False) + '\n')
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+EXPORT_WRITERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
@@ -0,0 +1,332 @@
+# join_buffer.py
+"""
+Буфер принятых, но еще не записанных вступлений (режим Giveaway.buffered_joins).
+
+Вступление проверяется по множеству участников в буфере и подтверждается сразу,
+в Participant его переносит flush_buffered_joins пачками bulk_create.
+Хранилище - Redis (JOIN_BUFFER_REDIS_URL), при его недоступности и без него -
+память процесса с журналом на диске: после падения процесса журнал подхватывает
+следующий запущенный процесс. Локальные вступления может записать только их
+процесс, поэтому розыгрыш не проводится, пока они есть в журналах других живых
+процессов (foreign_pending); JOIN_BUFFER_DIR должен быть общим для всех
+процессов сервиса.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:  # без redis работает только локальный буфер
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Результаты добавления в буфер
+BUFFER_ADDED = 'added'
+BUFFER_DUPLICATE = 'duplicate'
+BUFFER_FULL = 'full'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class LocalJoinBuffer:
+    """
+    Буфер в памяти процесса. Каждое вступление дописывается в журнал
+    joins-<pid>.log до подтверждения, после flush журнал переписывается.
+    """
+
+    def __init__(self, directory, fsync=True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.path = self.directory / f'joins-{os.getpid()}.log'
+        self._pending = OrderedDict()  # giveaway_id -> [user_id, ...] в порядке вступления
+        self._members = {}  # giveaway_id -> {user_id}, включая уже перенесенных этим процессом
+        self._lock = threading.Lock()
+        self._journal = None
+        with self._lock:
+            self._recover(at_start=True)
+            self._rewrite_journal()
+
+    @staticmethod
+    def _owner_pid(path):
+        """Процесс-владелец журнала: joins-<pid>.log или joins-<pid>.log.<pid>.recovering"""
+        parts = path.name.split('.')
+        try:
+            return int(parts[-2] if parts[-1] == 'recovering' else parts[0].split('-')[1])
+        except (IndexError, ValueError):
+            return None
+
+    def _journals(self):
+        return list(self.directory.glob('joins-*.log')) + list(self.directory.glob('joins-*.log.*.recovering'))
+
+    def _recover(self, at_start=False):
+        """
+        Забирает журналы завершившихся процессов; вызывается под self._lock.
+        При старте свой pid тоже чужой: он остался от прошлого процесса.
+        """
+        claims = []
+        for path in sorted(self._journals()):
+            pid = self._owner_pid(path)
+            if pid is None or (pid == os.getpid() and not at_start) or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            claimed = path.with_name(f'{path.name.split(".")[0]}.log.{os.getpid()}.recovering')
+            try:
+                os.rename(path, claimed)  # атомарно: журнал достанется одному процессу
+            except OSError:
+                continue
+            claims.append((path, claimed))
+        for path, claimed in claims:
+            with open(claimed, encoding='utf-8') as journal:
+                for line in journal:
+                    if line.endswith('\n'):  # оборванная при падении строка не подтверждалась
+                        giveaway_id, user_id = map(int, line.split())
+                        self._remember(giveaway_id, user_id)
+            logger.info(f"Восстановлено вступлений из журнала {path.name}")
+        if claims:
+            self._rewrite_journal()
+            for _, claimed in claims:
+                claimed.unlink()
+
+    def _remember(self, giveaway_id, user_id):
+        members = self._members.setdefault(giveaway_id, set())
+        if user_id not in members:
+            members.add(user_id)
+            self._pending.setdefault(giveaway_id, []).append(user_id)
+
+    def _write(self, text):
+        if self._journal is None:
+            self._journal = open(self.path, 'a', encoding='utf-8')
+        self._journal.write(text)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _rewrite_journal(self):
+        # Новый журнал пишется целиком и атомарно подменяет старый
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        temporary = self.path.with_suffix('.tmp')
+        with open(temporary, 'w', encoding='utf-8') as journal:
+            for giveaway_id, user_ids in self._pending.items():
+                journal.writelines(f'{giveaway_id} {user_id}\n' for user_id in user_ids)
+            journal.flush()
+            if self.fsync:
+                os.fsync(journal.fileno())
+        os.replace(temporary, self.path)
+
+    def add(self, giveaway_id, user_id, free_seats=None):
+        with self._lock:
+            members = self._members.setdefault(giveaway_id, set())
+            if user_id in members:
+                return BUFFER_DUPLICATE
+            pending = self._pending.get(giveaway_id, ())
+            if free_seats is not None and len(pending) >= free_seats:
+                return BUFFER_FULL
+            self._write(f'{giveaway_id} {user_id}\n')
+            members.add(user_id)
+            self._pending.setdefault(giveaway_id, []).append(user_id)
+            return BUFFER_ADDED
+
+    def contains(self, giveaway_id, user_id):
+        with self._lock:
+            return user_id in self._members.get(giveaway_id, ())
+
+    def pending_count(self, giveaway_id):
+        with self._lock:
+            return len(self._pending.get(giveaway_id, ()))
+
+    def pending(self, giveaway_id, limit, offset=0):
+        with self._lock:
+            return list(self._pending.get(giveaway_id, ())[offset:offset + limit])
+
+    def ack(self, giveaway_id, count):
+        """Убирает первые count вступлений, уже записанных в БД"""
+        with self._lock:
+            remaining = self._pending.get(giveaway_id, [])[count:]
+            if remaining:
+                self._pending[giveaway_id] = remaining
+            else:
+                self._pending.pop(giveaway_id, None)
+            self._rewrite_journal()
+
+    def pending_giveaway_ids(self):
+        with self._lock:
+            return list(self._pending)
+
+    def queues(self):
+        """Очереди для flush: каждая пачка подтверждается в той очереди, из которой прочитана"""
+        return [self]
+
+    def foreign_pending(self, giveaway_id):
+        """
+        Вступления розыгрыша в журналах других живых процессов. Журналы
+        завершившихся процессов сначала забираются себе - их запишет этот процесс.
+        """
+        with self._lock:
+            self._recover()
+        prefix = f'{giveaway_id} '
+        count = 0
+        # Вместе с журналами, которые другой процесс сейчас восстанавливает
+        for path in self._journals():
+            if self._owner_pid(path) == os.getpid():
+                continue
+            try:
+                with open(path, encoding='utf-8') as journal:
+                    count += sum(1 for line in journal if line.startswith(prefix) and line.endswith('\n'))
+            except FileNotFoundError:
+                continue
+        return count
+
+    def forget(self, giveaway_id):
+        """Розыгрыш проведен: множество участников больше не нужно"""
+        with self._lock:
+            self._members.pop(giveaway_id, None)
+            if self._pending.pop(giveaway_id, None):
+                self._rewrite_journal()
+
+
+# Проверка и добавление одной операцией: дубликат, лимит мест, запись в очередь
+_ADD_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then return 0 end
+local free = tonumber(ARGV[2])
+if free >= 0 and redis.call('LLEN', KEYS[2]) >= free then return 2 end
+redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('RPUSH', KEYS[2], ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[3])
+return 1
+"""
+_ADD_RESULTS = {0: BUFFER_DUPLICATE, 1: BUFFER_ADDED, 2: BUFFER_FULL}
+
+# Подтверждение flush: опустевшая очередь убирается из списка ожидающих
+_ACK_SCRIPT = """
+redis.call('LTRIM', KEYS[1], ARGV[1], -1)
+if redis.call('LLEN', KEYS[1]) == 0 then redis.call('SREM', KEYS[2], ARGV[2]) end
+"""
+
+
+class RedisJoinBuffer:
+    """
+    Буфер в Redis, общий для всех процессов: множество участников и очередь
+    на розыгрыш. При ошибке Redis вступления уходят в локальный буфер.
+    Очередь забирает один flush за раз: он держит блокировку строки розыгрыша.
+    pending и ack работают только с очередью Redis, локальная - отдельная
+    очередь в queues().
+    """
+    PENDING_SET_KEY = 'joins:pending-giveaways'
+
+    def __init__(self, url, fallback):
+        self.client = redis.Redis.from_url(url)
+        self.fallback = fallback
+        self._add = self.client.register_script(_ADD_SCRIPT)
+        self._ack = self.client.register_script(_ACK_SCRIPT)
+
+    @staticmethod
+    def _members_key(giveaway_id):
+        return f'joins:{giveaway_id}:members'
+
+    @staticmethod
+    def _queue_key(giveaway_id):
+        return f'joins:{giveaway_id}:queue'
+
+    def add(self, giveaway_id, user_id, free_seats=None):
+        # Занятые локальным буфером места тоже учитываются
+        local_pending = self.fallback.pending_count(giveaway_id)
+        if free_seats is not None:
+            free_seats = max(free_seats - local_pending, 0)
+        try:
+            result = self._add(
+                keys=[self._members_key(giveaway_id), self._queue_key(giveaway_id), self.PENDING_SET_KEY],
+                args=[user_id, -1 if free_seats is None else free_seats, giveaway_id],
+            )
+        except redis.RedisError as exc:
+            logger.warning(f"Redis недоступен, вступление записано в локальный буфер: {exc}")
+            return self.fallback.add(giveaway_id, user_id, free_seats)
+        return _ADD_RESULTS[int(result)]
+
+    def contains(self, giveaway_id, user_id):
+        try:
+            if self.client.sismember(self._members_key(giveaway_id), user_id):
+                return True
+        except redis.RedisError:
+            pass
+        return self.fallback.contains(giveaway_id, user_id)
+
+    def pending_count(self, giveaway_id):
+        try:
+            count = self.client.llen(self._queue_key(giveaway_id))
+        except redis.RedisError:
+            count = 0
+        return count + self.fallback.pending_count(giveaway_id)
+
+    def pending(self, giveaway_id, limit, offset=0):
+        try:
+            user_ids = self.client.lrange(self._queue_key(giveaway_id), offset, offset + limit - 1)
+        except redis.RedisError as exc:
+            # Очередь остается в Redis и запишется следующим flush
+            logger.warning(f"Redis недоступен, очередь вступлений розыгрыша {giveaway_id} не прочитана: {exc}")
+            return []
+        return [int(user_id) for user_id in user_ids]
+
+    def ack(self, giveaway_id, count):
+        try:
+            self._ack(keys=[self._queue_key(giveaway_id), self.PENDING_SET_KEY], args=[count, giveaway_id])
+        except redis.RedisError as exc:
+            # Пачка запишется повторно, существующие участники будут пропущены
+            logger.warning(f"Redis недоступен, записанные вступления розыгрыша {giveaway_id} не подтверждены: {exc}")
+
+    def queues(self):
+        # Сначала локальная: ее нельзя потерять вместе с процессом
+        return [self.fallback, self]
+
+    def foreign_pending(self, giveaway_id):
+        # Очередь Redis общая и записывается любым процессом
+        return self.fallback.foreign_pending(giveaway_id)
+
+    def pending_giveaway_ids(self):
+        try:
+            ids = {int(giveaway_id) for giveaway_id in self.client.smembers(self.PENDING_SET_KEY)}
+        except redis.RedisError:
+            ids = set()
+        return sorted(ids | set(self.fallback.pending_giveaway_ids()))
+
+    def forget(self, giveaway_id):
+        self.fallback.forget(giveaway_id)
+        try:
+            self.client.delete(self._members_key(giveaway_id), self._queue_key(giveaway_id))
+            self.client.srem(self.PENDING_SET_KEY, giveaway_id)
+        except redis.RedisError as exc:
+            # Очередь завершенного розыгрыша flush отбросит сам
+            logger.warning(f"Redis недоступен, буфер розыгрыша {giveaway_id} не очищен: {exc}")
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_join_buffer():
+    """Буфер процесса, создается при первом обращении"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            local = LocalJoinBuffer(settings.JOIN_BUFFER_DIR, fsync=settings.JOIN_BUFFER_FSYNC)
+            url = getattr(settings, 'JOIN_BUFFER_REDIS_URL', None)
+            if url and redis is not None:
+                _buffer = RedisJoinBuffer(url, fallback=local)
+            else:
+                _buffer = local
+        return _buffer
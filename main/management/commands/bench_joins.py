@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from main.benchmarks.joins import PROFILES, run_join_benchmark
+from main.benchmarks.runner import write_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность конкурентных вступлений в розыгрыш на тестовой БД. '
+        'С --profile каждый профиль БД прогоняется в отдельном процессе '
+        '(для postgres-профилей нужны DB_NAME/DB_USER/DB_PASSWORD/DB_HOST локального сервера).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES), help='Профили БД для сравнения')
+        parser.add_argument('--threads', type=int, default=32, help='Одновременных потоков')
+        parser.add_argument('--joins-per-thread', type=int, default=50, help='Вступлений на поток')
+        parser.add_argument('--output', help='Куда записать результаты (JSON)')
+        parser.add_argument('--json', action='store_true', help='Вывести результат текущего профиля в JSON')
+
+    def handle(self, *args, **options):
+        if options['profile']:
+            results = {name: self.run_profile(name, options) for name in options['profile']}
+        else:
+            results = {'current': self.run_here(options)}
+            if options['json']:
+                self.stdout.write(json.dumps(results['current']))
+                return
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name}: {result["joins_per_sec"]} вступлений/с, p95 {result["p95_ms"]} ms, '
+                f'статусы {result["statuses"]}'
+            )
+            if result['participants_count'] != result['statuses'].get('joined', 0):
+                self.stdout.write(self.style.ERROR(f'{name}: participants_count расходится с числом вступлений'))
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'✅ Результаты записаны в {options["output"]}'))
+
+    def run_here(self, options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            return run_join_benchmark(options['threads'], options['joins_per_thread'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_profile(self, name, options):
+        command = [
+            sys.executable, 'manage.py', 'bench_joins', '--json',
+            '--threads', str(options['threads']), '--joins-per-thread', str(options['joins_per_thread']),
+        ]
+        completed = subprocess.run(
+            command, cwd=settings.BASE_DIR, env={**os.environ, **PROFILES[name]}, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'Профиль {name} завершился с ошибкой:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
@@ -0,0 +1,120 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from main.models import Giveaway, Participant, Winner
+
+BENCH_PREFIX = 'bench_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Планы запросов и время выполнения горячих запросов. '
+        'Для сравнения "до/после" запустите до и после `migrate main 0004`.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Сначала создать тестовый набор данных')
+        parser.add_argument('--participants', type=int, default=1_000_000, help='Число участников в наборе')
+        parser.add_argument('--giveaways', type=int, default=100, help='Число розыгрышей в наборе')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого запроса')
+        parser.add_argument('--json', dest='json_path', help='Сохранить результаты в JSON-файл')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['participants'], options['giveaways'])
+
+        giveaway = (
+            Giveaway.objects.filter(join_code__startswith=BENCH_PREFIX)
+            .order_by('-participants_count')
+            .first()
+        )
+        if giveaway is None:
+            self.stderr.write('Нет тестовых данных, запустите с --seed')
+            return
+        user = giveaway.participants.order_by('id').values_list('user', flat=True).first()
+        now = timezone.now()
+
+        queries = {
+            'active_giveaways': Giveaway.objects.filter(is_active=True).order_by('draw_time', 'id')[:20],
+            'my_giveaways': Giveaway.objects.filter(created_by=giveaway.created_by_id).order_by('draw_time', 'id')[:20],
+            'due_giveaways': Giveaway.objects.filter(
+                is_active=True, draw_time__lte=now, draw_dispatched_at__isnull=True
+            ).order_by('draw_time', 'id')[:200],
+            'is_joined': Participant.objects.filter(giveaway=giveaway, user=user)[:1],
+            'participants_page': Participant.objects.filter(giveaway=giveaway).order_by('joined_at', 'id')[:100],
+            'my_participations': Participant.objects.filter(user=user).order_by('-joined_at')[:20],
+            'winners_page': Winner.objects.filter(giveaway=giveaway).order_by('won_at', 'id')[:100],
+        }
+
+        results = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+                'plan': plan,
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: {results[name]["median_ms"]} ms (медиана)'))
+            self.stdout.write(plan)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'vendor': connection.vendor, 'results': results}, f, ensure_ascii=False, indent=2)
+
+    def seed(self, participants, giveaways):
+        """Пользователи x розыгрыши так, чтобы в сумме получилось participants участий"""
+        users_count = max(participants // giveaways, 1)
+        batch_size = 5000
+
+        with transaction.atomic():
+            # Хеш '!' - непригодный пароль, PBKDF2 не вызывается
+            User.objects.bulk_create(
+                (User(username=f'{BENCH_PREFIX}{i}', password='!') for i in range(users_count)),
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            user_ids = list(
+                User.objects.filter(username__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True)
+            )
+            now = timezone.now()
+            Giveaway.objects.bulk_create(
+                (
+                    Giveaway(
+                        title=f'Benchmark {i}',
+                        join_code=f'{BENCH_PREFIX}{i}',
+                        draw_time=now + timedelta(hours=i - giveaways // 2),
+                        is_active=i % 3 != 0,
+                        created_by_id=user_ids[i % len(user_ids)],
+                        participants_count=len(user_ids),
+                    )
+                    for i in range(giveaways)
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            giveaway_ids = list(
+                Giveaway.objects.filter(join_code__startswith=BENCH_PREFIX).values_list('id', flat=True)
+            )
+
+        for giveaway_id in giveaway_ids:
+            with transaction.atomic():
+                Participant.objects.bulk_create(
+                    (Participant(user_id=user_id, giveaway_id=giveaway_id) for user_id in user_ids),
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Создано: {len(user_ids)} пользователей, {len(giveaway_ids)} розыгрышей, '
+            f'{len(user_ids) * len(giveaway_ids)} участий'
+        ))
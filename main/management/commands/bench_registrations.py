@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from main.benchmarks.registrations import HASHER_PROFILES, hasher_available, run_registration_benchmark
+from main.benchmarks.runner import write_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Регистраций в секунду на ядро для разных PASSWORD_HASHERS на тестовой БД. '
+        'Профили без установленной библиотеки хешера (argon2-cffi) пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasher', action='append', choices=list(HASHER_PROFILES), help='Профили хешеров')
+        parser.add_argument('--registrations', type=int, default=100, help='Регистраций на профиль')
+        parser.add_argument('--threads', type=int, help='Одновременных запросов (по умолчанию 2 x PASSWORD_HASH_WORKERS)')
+        parser.add_argument('--output', help='Куда записать результаты (JSON)')
+
+    def handle(self, *args, **options):
+        threads = options['threads'] or 2 * settings.PASSWORD_HASH_WORKERS
+        results = {}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for name in options['hasher'] or list(HASHER_PROFILES):
+                if not hasher_available(name):
+                    self.stdout.write(self.style.WARNING(f'{name}: библиотека хешера не установлена, пропущен'))
+                    continue
+                result = results[name] = run_registration_benchmark(name, threads, options['registrations'])
+                self.stdout.write(
+                    f'{name}: {result["registrations_per_sec"]} рег/с, '
+                    f'{result["registrations_per_sec_per_core"]} рег/с на ядро, p95 {result.get("p95_ms")} ms'
+                )
+                if result['errors']:
+                    self.stdout.write(self.style.ERROR(f'{name}: ошибки {result["errors"][:3]}'))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'✅ Результаты записаны в {options["output"]}'))
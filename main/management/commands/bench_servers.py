@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from main.benchmarks.datasets import seed_dataset
+from main.benchmarks.runner import write_results
+from main.benchmarks.servers import ENDPOINTS, run_server_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение пропускной способности WSGI (gunicorn gthread) и ASGI (uvicorn) '
+        'при многих одновременных соединениях. Работает с настроенной БД: '
+        'серверы-подпроцессы не видят тестовую.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', choices=['wsgi', 'asgi'], help='Только эти серверы')
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='Только эти эндпоинты')
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на эндпоинт')
+        parser.add_argument('--concurrency', type=int, default=200, help='Одновременных соединений')
+        parser.add_argument('--workers', type=int, default=1, help='Процессов сервера')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков на процесс gunicorn')
+        parser.add_argument('--users', type=int, default=2000, help='Пользователей в наборе данных')
+        parser.add_argument('--participants-per-giveaway', type=int, default=1000, help='Участников на розыгрыш')
+        parser.add_argument('--output', help='Куда записать результаты (JSON)')
+
+    def handle(self, *args, **options):
+        # ignore_conflicts - повторный запуск переиспользует тот же набор
+        dataset = seed_dataset(options['users'], 1, options['participants_per_giveaway'], prefix='srvbench')
+        results = run_server_benchmarks(
+            dataset,
+            servers=options['server'] or ['wsgi', 'asgi'],
+            endpoints=options['endpoint'] or list(ENDPOINTS),
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            workers=options['workers'],
+            threads=options['threads'],
+            log=self.stdout.write,
+        )
+        if options['output']:
+            write_results({'scenarios': results, 'options': {
+                key: options[key] for key in ('requests', 'concurrency', 'workers', 'threads')
+            }}, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'✅ Результаты записаны в {options["output"]}'))
@@ -1,13 +1,29 @@
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from main.models import Giveaway, Participant
+from main.benchmarks.datasets import DEFAULT_BATCH_SIZE, seed_dataset
 from django.utils import timezone
 from datetime import timedelta
 
 class Command(BaseCommand):
-    help = 'Создание тестовых данных для розыгрышей'
+    help = (
+        'Создание тестовых данных для розыгрышей. '
+        'С --users/--giveaways/--participants-per-giveaway - массовая генерация для нагрузочных тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, help='Число синтетических пользователей')
+        parser.add_argument('--giveaways', type=int, default=10, help='Число розыгрышей')
+        parser.add_argument('--participants-per-giveaway', type=int, default=1000, help='Участников на розыгрыш')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора (одинаковый seed - одинаковые данные)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Строк в одном INSERT')
+        parser.add_argument('--prefix', default='synthetic', help='Префикс имен пользователей и кодов розыгрышей')
 
     def handle(self, *args, **options):
+        if options['users']:
+            return self.generate(options)
+        
         # Создаем тестовых пользователей
         organizer, _ = User.objects.get_or_create(
             username='organizer',
@@ -60,4 +76,23 @@ class Command(BaseCommand):
             self.style.SUCCESS('✅ Тестовые данные успешно созданы!')
         )
         self.stdout.write('👥 Пользователи: organizer/password123, participant1/password123, participant2/password123')
-        self.stdout.write('🎪 Розыгрыши: IPHONE2024, MACBOOK2024')
\ No newline at end of file
+        self.stdout.write('🎪 Розыгрыши: IPHONE2024, MACBOOK2024')
+
+    def generate(self, options):
+        """Массовая генерация: bulk_create пачками, один хеш пароля на всех, без сигналов"""
+        started = time.monotonic()
+        result = seed_dataset(
+            users=options['users'],
+            giveaways=options['giveaways'],
+            participants_per_giveaway=options['participants_per_giveaway'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Сгенерировано за {elapsed:.1f} с: {result['users']} пользователей, "
+            f"{result['giveaways']} розыгрышей, {result['participants']} участий"
+        ))
+        self.stdout.write(f"👥 Пароль всех пользователей {options['prefix']}_user_N: password123")
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from main.benchmarks.runner import SCALES, compare, load_results, run_benchmarks, write_results
+from main.benchmarks.scenarios import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарки API и розыгрыша на отдельной тестовой БД с выгрузкой результатов в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Готовый размер набора данных')
+        parser.add_argument('--users', type=int, help='Число пользователей (перекрывает --scale)')
+        parser.add_argument('--giveaways', type=int, help='Число розыгрышей (перекрывает --scale)')
+        parser.add_argument('--participants-per-giveaway', type=int, help='Участников на розыгрыш (перекрывает --scale)')
+        parser.add_argument('--iterations', type=int, default=20, help='Повторов каждого сценария')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора данных')
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Запустить только эти сценарии')
+        parser.add_argument('--output', help='Куда записать результаты (JSON)')
+        parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Допустимое замедление, 0.2 = 20%%')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую БД после прогона')
+
+    def handle(self, *args, **options):
+        users, giveaways, per_giveaway = SCALES[options['scale']]
+        users = options['users'] or users
+        giveaways = options['giveaways'] or giveaways
+        per_giveaway = options['participants_per_giveaway'] or per_giveaway
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = run_benchmarks(
+                users, giveaways, per_giveaway, options['iterations'],
+                seed=options['seed'], only=options['scenario'], log=self.stdout.write,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'✅ Результаты записаны в {options["output"]}'))
+
+        if options['baseline']:
+            ratios, regressions = compare(results, load_results(options['baseline']), options['threshold'])
+            for name, ratio in ratios.items():
+                style = self.style.ERROR if name in regressions else self.style.SUCCESS
+                self.stdout.write(style(f'{name}: x{ratio} от базового прогона'))
+            if regressions:
+                raise CommandError(f'Регрессия производительности: {", ".join(regressions)}')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from main.models import Giveaway, Participant
+
+
+class Command(BaseCommand):
+    help = 'Сверка счетчика participants_count с фактическим числом участников'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--giveaway', type=int, help='ID розыгрыша (по умолчанию - все)')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        actual = Coalesce(
+            Subquery(
+                Participant.objects.filter(giveaway=OuterRef('pk'))
+                .values('giveaway')
+                .annotate(total=Count('pk'))
+                .values('total')
+            ),
+            0,
+        )
+
+        giveaways = Giveaway.objects.all()
+        if options['giveaway']:
+            giveaways = giveaways.filter(pk=options['giveaway'])
+
+        drifted = list(
+            giveaways.annotate(actual_count=actual)
+            .exclude(participants_count=F('actual_count'))
+            .values_list('pk', 'participants_count', 'actual_count')
+        )
+
+        for pk, stored, real in drifted:
+            self.stdout.write(f'Розыгрыш {pk}: сохранено {stored}, фактически {real}')
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✅ Расхождений не найдено'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(f'Найдено расхождений: {len(drifted)}')
+            return
+
+        updated = Giveaway.objects.filter(pk__in=[pk for pk, _, _ in drifted]).update(
+            participants_count=actual
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ Исправлено счетчиков: {updated}'))
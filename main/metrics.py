@@ -0,0 +1,87 @@
+# metrics.py
+import threading
+from bisect import bisect_left
+
+# Границы корзин гистограмм (верхние, включительно)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'giveaway_request_duration_seconds': ('Время обработки запроса', DURATION_BUCKETS),
+    'giveaway_db_queries': ('Число SQL-запросов на HTTP-запрос', QUERY_COUNT_BUCKETS),
+    'giveaway_db_duration_seconds': ('Суммарное время SQL-запросов', DURATION_BUCKETS),
+    'giveaway_response_size_bytes': ('Размер тела ответа', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Гистограммы по имени view в памяти процесса"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, values):
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Текстовый формат Prometheus (version 0.0.4)"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            snapshot = [(name, view, list(h.counts), h.sum, h.count) for (name, view), h in items]
+
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for metric, view, counts, total, count in snapshot:
+                if metric != name:
+                    continue
+                label = _escape(view)
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{view="{label}",le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{view="{label}"}} {total}')
+                lines.append(f'{name}_count{{view="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_counters(name, description, labels_to_values, label_name):
+    """Счетчики с одной меткой, например попадания кеша по типу"""
+    lines = [f'# HELP {name} {description}', f'# TYPE {name} counter']
+    for label, value in labels_to_values.items():
+        lines.append(f'{name}{{{label_name}="{_escape(label)}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
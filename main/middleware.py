@@ -0,0 +1,85 @@
+# middleware.py
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+
+class QueryCounter:
+    """execute_wrapper: считает SQL-запросы и их суммарное время"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class ProfilingMiddleware:
+    """
+    Собирает по имени view время ответа, число и время SQL-запросов и размер ответа.
+    Профилируется доля запросов PROFILING_SAMPLE_RATE (0 - выключено).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        # Async ORM выполняет SQL в других потоках, execute_wrapper их не видит:
+        # для ASGI пишем только время и размер ответа
+        self._record(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def _sampled():
+        sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        return sample_rate > 0 and random.random() < sample_rate
+
+    @staticmethod
+    def _record(request, response, elapsed, counter=None):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unresolved'
+        values = {'giveaway_request_duration_seconds': elapsed}
+        if counter is not None:
+            values['giveaway_db_queries'] = counter.count
+            values['giveaway_db_duration_seconds'] = counter.duration
+        # У потоковых ответов размер заранее неизвестен
+        if not response.streaming:
+            values['giveaway_response_size_bytes'] = len(response.content)
+        registry.observe(view, values)
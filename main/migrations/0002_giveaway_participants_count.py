@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_participants_count(apps, schema_editor):
+    Giveaway = apps.get_model('main', 'Giveaway')
+    Participant = apps.get_model('main', 'Participant')
+    counts = (
+        Participant.objects.filter(giveaway=OuterRef('pk'))
+        .values('giveaway')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Giveaway.objects.update(participants_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='giveaway',
+            name='participants_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_participants_count, migrations.RunPython.noop),
+    ]
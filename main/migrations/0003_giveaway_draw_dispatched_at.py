@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_giveaway_participants_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='giveaway',
+            name='draw_dispatched_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_giveaway_draw_dispatched_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='giveaway',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['draw_time', 'id'], name='giveaway_active_draw_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='giveaway',
+            index=models.Index(fields=['created_by', 'draw_time', 'id'], name='giveaway_owner_draw_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['giveaway', 'joined_at', 'id'], name='participant_giveaway_join_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['user', 'joined_at'], name='participant_user_join_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='winner',
+            index=models.Index(fields=['giveaway', 'won_at', 'id'], name='winner_giveaway_won_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='weight',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='PrizeTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=1)),
+                ('name', models.CharField(max_length=200)),
+                ('winners_count', models.PositiveIntegerField(default=1)),
+                ('giveaway', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prize_tiers', to='main.giveaway')),
+            ],
+            options={
+                'ordering': ['giveaway', 'position'],
+                'unique_together': {('giveaway', 'position')},
+            },
+        ),
+        migrations.AddField(
+            model_name='winner',
+            name='tier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='winners', to='main.prizetier'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_prize_tiers_and_weights'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrawAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('algorithm', models.CharField(max_length=50)),
+                ('seed', models.PositiveBigIntegerField()),
+                ('participants_digest', models.CharField(max_length=64)),
+                ('participants_count', models.PositiveIntegerField()),
+                ('winners_requested', models.PositiveIntegerField()),
+                ('winner_ids', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('giveaway', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='draw_audit', to='main.giveaway')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_draw_audit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='giveaway',
+            name='buffered_joins',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:13
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+def raise_zero_weights(apps, schema_editor):
+    # Существующие веса 0 не пройдут ограничение
+    apps.get_model('main', 'Participant').objects.filter(weight=0).update(weight=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_giveaway_buffered_joins'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='participant',
+            name='weight',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(raise_zero_weights, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='participant',
+            constraint=models.CheckConstraint(condition=models.Q(('weight__gte', 1)), name='participant_weight_gte_1'),
+        ),
+    ]
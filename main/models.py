@@ -1,6 +1,20 @@
 # models.py
 from django.contrib.auth.models import User
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, OuterRef
+
+
+class GiveawayQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Подтягивает организатора и флаг участия пользователя одним запросом"""
+        queryset = self.select_related('created_by')
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(
+                is_joined=Exists(Participant.objects.filter(giveaway=OuterRef('pk'), user=user))
+            )
+        return queryset
+
 
 class Giveaway(models.Model):
     title = models.CharField(max_length=200)
@@ -12,23 +26,80 @@ class Giveaway(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_giveaways')
     created_at = models.DateTimeField(auto_now_add=True)
     winners_count = models.PositiveIntegerField(default=1)  # Количество победителей
+    participants_count = models.PositiveIntegerField(default=0, editable=False)  # Счетчик участников (обновляется сигналами)
+    draw_dispatched_at = models.DateTimeField(null=True, blank=True, editable=False)  # Когда планировщик отправил розыгрыш в очередь
+    buffered_joins = models.BooleanField(default=False)  # Вступления через буфер с отложенной записью (для пиков трафика)
+    
+    objects = GiveawayQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Лента активных розыгрышей и планировщик: is_active + draw_time
+            models.Index(
+                fields=['draw_time', 'id'],
+                condition=models.Q(is_active=True),
+                name='giveaway_active_draw_idx',
+            ),
+            # Розыгрыши организатора (my_giveaways)
+            models.Index(fields=['created_by', 'draw_time', 'id'], name='giveaway_owner_draw_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
+class PrizeTier(models.Model):
+    giveaway = models.ForeignKey(Giveaway, on_delete=models.CASCADE, related_name='prize_tiers')
+    position = models.PositiveSmallIntegerField(default=1)  # 1 - главный приз, разыгрывается первым
+    name = models.CharField(max_length=200)
+    winners_count = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        ordering = ['giveaway', 'position']
+        unique_together = ['giveaway', 'position']
+    
+    def __str__(self):
+        return self.name
+
 class Participant(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='participations')
     giveaway = models.ForeignKey(Giveaway, on_delete=models.CASCADE, related_name='participants')
     joined_at = models.DateTimeField(auto_now_add=True)
+    weight = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])  # Число записей участника (бонусные входы)
     
     class Meta:
         unique_together = ['user', 'giveaway']  # Один пользователь - одна запись
+        indexes = [
+            # Список участников розыгрыша в порядке регистрации
+            models.Index(fields=['giveaway', 'joined_at', 'id'], name='participant_giveaway_join_idx'),
+            # Участия пользователя (MyParticipationsViewSet)
+            models.Index(fields=['user', 'joined_at'], name='participant_user_join_idx'),
+        ]
+        constraints = [
+            # Вес 0 ломает взвешенный розыгрыш (log(u) / 0)
+            models.CheckConstraint(condition=models.Q(weight__gte=1), name='participant_weight_gte_1'),
+        ]
 
 class Winner(models.Model):
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='wins')
     giveaway = models.ForeignKey(Giveaway, on_delete=models.CASCADE, related_name='winners')
     won_at = models.DateTimeField(auto_now_add=True)
     prize_description = models.TextField(blank=True)
+    tier = models.ForeignKey(PrizeTier, on_delete=models.SET_NULL, null=True, blank=True, related_name='winners')
     
     class Meta:
-        unique_together = ['participant', 'giveaway']
\ No newline at end of file
+        unique_together = ['participant', 'giveaway']
+        indexes = [
+            # Список победителей розыгрыша
+            models.Index(fields=['giveaway', 'won_at', 'id'], name='winner_giveaway_won_idx'),
+        ]
+
+class DrawAudit(models.Model):
+    """Данные для проверки проведенного розыгрыша"""
+    giveaway = models.OneToOneField(Giveaway, on_delete=models.CASCADE, related_name='draw_audit')
+    algorithm = models.CharField(max_length=50)  # Версия алгоритма выбора
+    seed = models.PositiveBigIntegerField()
+    participants_digest = models.CharField(max_length=64)  # sha256 по участникам в порядке ID
+    participants_count = models.PositiveIntegerField()
+    winners_requested = models.PositiveIntegerField()  # Сколько мест разыгрывалось
+    winner_ids = models.JSONField(default=list)  # ID участников-победителей в порядке вытягивания
+    created_at = models.DateTimeField(auto_now_add=True)
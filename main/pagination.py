@@ -0,0 +1,75 @@
+# pagination.py
+from bisect import bisect_left, bisect_right
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация: без OFFSET и без COUNT(*).
+    Второе поле сортировки (id) разрешает совпадения по времени.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class GiveawayCursorPagination(KeysetPagination):
+    ordering = ('draw_time', 'id')
+
+
+class ParticipantCursorPagination(KeysetPagination):
+    ordering = ('joined_at', 'id')
+
+
+class WinnerCursorPagination(KeysetPagination):
+    ordering = ('won_at', 'id')
+
+
+class IndexCursorPagination(GiveawayCursorPagination):
+    """
+    Тот же порядок (draw_time, id) и тот же ответ {next, previous, results},
+    что у GiveawayCursorPagination, но по готовому отсортированному списку
+    ключей (draw_time, id), например из кешированного индекса участий.
+    """
+
+    def paginate_keys(self, keys, request):
+        """ID розыгрышей страницы; ссылки - для get_paginated_response"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            start, end = 0, min(page_size, len(keys))
+        elif cursor.reverse:
+            end = bisect_left(keys, self._decode_position(cursor.position))
+            start = max(end - page_size, 0)
+        else:
+            start = bisect_right(keys, self._decode_position(cursor.position))
+            end = min(start + page_size, len(keys))
+
+        page = keys[start:end]
+        self._next = self._link(page[-1], False) if page and end < len(keys) else None
+        self._previous = self._link(page[0], True) if page and start > 0 else None
+        return [giveaway_id for _, giveaway_id in page]
+
+    def _link(self, key, reverse):
+        draw_time, giveaway_id = key
+        return self.encode_cursor(Cursor(offset=0, reverse=reverse, position=f'{draw_time.isoformat()}|{giveaway_id}'))
+
+    def _decode_position(self, position):
+        try:
+            draw_time, giveaway_id = position.split('|')
+            key = (parse_datetime(draw_time), int(giveaway_id))
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if key[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return key
+
+    def get_next_link(self):
+        return self._next
+
+    def get_previous_link(self):
+        return self._previous
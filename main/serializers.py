@@ -1,7 +1,9 @@
 # serializers.py
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import IntegrityError
 from .models import Giveaway, Participant, Winner
+from .services import ENROLL_MAX_IDENTIFIERS, register_user
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,7 +12,6 @@ class UserSerializer(serializers.ModelSerializer):
 
 class GiveawaySerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
-    participants_count = serializers.SerializerMethodField()
     is_joined = serializers.SerializerMethodField()
     is_creator = serializers.SerializerMethodField()
     
@@ -18,10 +19,10 @@ class GiveawaySerializer(serializers.ModelSerializer):
         model = Giveaway
         fields = '__all__'
     
-    def get_participants_count(self, obj):
-        return obj.participants.count()
-    
     def get_is_joined(self, obj):
+        # Аннотация из GiveawayQuerySet.with_user_flags, если она есть
+        if hasattr(obj, 'is_joined'):
+            return obj.is_joined
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.participants.filter(user=request.user).exists()
@@ -30,7 +31,7 @@ class GiveawaySerializer(serializers.ModelSerializer):
     def get_is_creator(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.created_by == request.user
+            return obj.created_by_id == request.user.id
         return False
 
 class ParticipantSerializer(serializers.ModelSerializer):
@@ -48,6 +49,20 @@ class WinnerSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class BulkEnrollSerializer(serializers.Serializer):
+    """Список пользователей для массовой регистрации (по ID и/или username)"""
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    usernames = serializers.ListField(child=serializers.CharField(max_length=150), required=False, default=list)
+    
+    def validate(self, attrs):
+        total = len(attrs['user_ids']) + len(attrs['usernames'])
+        if not total:
+            raise serializers.ValidationError("Укажите user_ids или usernames")
+        if total > ENROLL_MAX_IDENTIFIERS:
+            raise serializers.ValidationError(f"Не больше {ENROLL_MAX_IDENTIFIERS} пользователей за запрос")
+        return attrs
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
@@ -62,10 +77,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
-        validated_data.pop('password_confirm')
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data.get('email', ''),
-            password=validated_data['password']
-        )
+        # Пользователь вместе с токеном: user.auth_token доступен без запроса
+        try:
+            user, _ = register_user(
+                validated_data['username'],
+                validated_data.get('email', ''),
+                validated_data['password'],
+            )
+        except IntegrityError:
+            raise serializers.ValidationError({'username': ['A user with that username already exists.']})
         return user
\ No newline at end of file
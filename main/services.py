@@ -1,59 +1,486 @@
-import random
+import asyncio
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.utils import timezone
-from django.db import transaction
-from .models import Giveaway, Winner
+from django.utils.dateparse import parse_datetime
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from .models import DrawAudit, Giveaway, Participant, Winner
+from .cache import get_giveaway_data, get_join_code_entry, giveaway_pk, invalidate_participation_indexes, invalidate_participations
+from .join_buffer import BUFFER_ADDED, BUFFER_DUPLICATE, get_join_buffer
+from .draw import DRAW_ALGORITHM, DRAW_CHUNK_SIZE, draw_pass, new_seed, participants_digest, participants_snapshot
 
 logger = logging.getLogger(__name__)
 
-def perform_giveaway_draw(giveaway_id):
+# Отказ perform_giveaway_draw: выборка по winner_ids сделана до последних вступлений
+DRAW_SAMPLE_STALE = "Состав участников изменился после выборки победителей"
+# Отказ perform_giveaway_draw: вступления еще в буферах других процессов
+DRAW_JOINS_PENDING = "Принятые вступления еще не записаны другими процессами"
+
+# Результаты попытки участия в розыгрыше
+JOIN_OK = 'joined'
+JOIN_ALREADY_JOINED = 'already_joined'
+JOIN_FULL = 'full'
+JOIN_CLOSED = 'closed'
+JOIN_NOT_FOUND = 'not_found'
+JOIN_QUEUED = 'queued'  # принято в буфер, запись в БД - при flush
+
+
+def _open_giveaway_with_free_seat(giveaway_id, now):
+    """
+    Розыгрыш, в который еще можно войти напрямую: открыт, есть свободное место
+    и вступления не буферизуются. Режим buffered_joins выясняется только на пути отказа.
+    """
+    has_free_seat = (
+        Q(max_participants__isnull=True)
+        | Q(max_participants=0)
+        | Q(participants_count__lt=F('max_participants'))
+    )
+    return Giveaway.objects.filter(
+        has_free_seat, pk=giveaway_id, is_active=True, buffered_joins=False, draw_time__gte=now
+    )
+
+
+def _refusal_reason(giveaway, already_joined, now):
+    if giveaway is None:
+        return JOIN_NOT_FOUND
+    if already_joined:
+        return JOIN_ALREADY_JOINED
+    if not giveaway['is_active'] or giveaway['draw_time'] < now:
+        return JOIN_CLOSED
+    return JOIN_FULL
+
+
+def join_giveaway(giveaway_id, user, giveaway=None):
+    """
+    Регистрация пользователя в розыгрыше без гонок.
+    Место резервируется одним условным UPDATE счетчика participants_count,
+    затем в той же транзакции вставляется Participant. Дубликат откатывает
+    транзакцию вместе с резервом. Причина отказа выясняется только на
+    неуспешном пути; если уже известны is_active и draw_time розыгрыша
+    (giveaway), строка розыгрыша для этого не читается. Розыгрыш с
+    buffered_joins резерв не проходит и уходит в buffered_join.
+    """
+    giveaway_id = giveaway_pk(giveaway_id)
+    if giveaway_id is None:
+        return JOIN_NOT_FOUND
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            reserved = _open_giveaway_with_free_seat(giveaway_id, now).update(
+                participants_count=F('participants_count') + 1
+            )
+
+            if reserved:
+                participant = Participant(user=user, giveaway_id=giveaway_id)
+                participant._seat_reserved = True  # счетчик уже увеличен
+                participant.save()
+                return JOIN_OK
+    except IntegrityError:
+        return JOIN_ALREADY_JOINED
+
+    if giveaway is None:
+        giveaway = Giveaway.objects.filter(pk=giveaway_id).values('is_active', 'draw_time', 'buffered_joins').first()
+    if giveaway is not None and giveaway.get('buffered_joins'):
+        return buffered_join(giveaway_id, user)
+    already_joined = giveaway is not None and Participant.objects.filter(giveaway_id=giveaway_id, user=user).exists()
+    return _refusal_reason(giveaway, already_joined, now)
+
+
+def join_by_code(join_code, user):
+    """
+    Вступление по коду: розыгрыш находится по кешированному индексу кодов,
+    закрытый отклоняется без запросов к БД. Возвращает (ID розыгрыша или None, результат).
+    """
+    entry = get_join_code_entry(join_code)
+    if entry is None:
+        return None, JOIN_NOT_FOUND
+    if not entry['is_active'] or entry['draw_time'] < timezone.now():
+        return entry['id'], JOIN_CLOSED
+    if entry['buffered_joins']:
+        return entry['id'], buffered_join(entry['id'], user)
+    return entry['id'], join_giveaway(entry['id'], user, giveaway=entry)
+
+
+async def ajoin_giveaway(giveaway_id, user):
+    """
+    Асинхронный вариант join_giveaway на async ORM.
+    Транзакции в async-коде недоступны, поэтому резерв места (атомарный UPDATE)
+    при дубликате возвращается компенсирующим UPDATE. Если процесс упадет между
+    ними, счетчик исправит команда sync_participants_count.
+    """
+    giveaway_id = giveaway_pk(giveaway_id)
+    if giveaway_id is None:
+        return JOIN_NOT_FOUND
+    now = timezone.now()
+    reserved = await _open_giveaway_with_free_seat(giveaway_id, now).aupdate(
+        participants_count=F('participants_count') + 1
+    )
+
+    if reserved:
+        participant = Participant(user=user, giveaway_id=giveaway_id)
+        participant._seat_reserved = True  # счетчик уже увеличен
+        try:
+            await participant.asave()
+            return JOIN_OK
+        except IntegrityError:
+            await Giveaway.objects.filter(pk=giveaway_id, participants_count__gt=0).aupdate(
+                participants_count=F('participants_count') - 1
+            )
+            return JOIN_ALREADY_JOINED
+
+    giveaway = await Giveaway.objects.filter(pk=giveaway_id).values('is_active', 'draw_time', 'buffered_joins').afirst()
+    if giveaway is not None and giveaway['buffered_joins']:
+        return await sync_to_async(buffered_join)(giveaway_id, user)
+    already_joined = giveaway is not None and await Participant.objects.filter(
+        giveaway_id=giveaway_id, user=user
+    ).aexists()
+    return _refusal_reason(giveaway, already_joined, now)
+
+# Ограничения массовой регистрации
+ENROLL_MAX_IDENTIFIERS = 50000
+ENROLL_BATCH_SIZE = 2000
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _resolve_user_ids(user_ids, usernames):
+    """ID существующих пользователей в порядке запроса и число неизвестных"""
+    resolved = []
+    unknown = 0
+    for chunk in _chunks(list(user_ids), ENROLL_BATCH_SIZE):
+        found = set(User.objects.filter(id__in=chunk).values_list('id', flat=True))
+        unknown += sum(1 for user_id in chunk if user_id not in found)
+        resolved.extend(user_id for user_id in chunk if user_id in found)
+    for chunk in _chunks(list(usernames), ENROLL_BATCH_SIZE):
+        found = dict(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+        unknown += sum(1 for username in chunk if username not in found)
+        resolved.extend(found[username] for username in chunk if username in found)
+    return resolved, unknown
+
+
+def _without_participants(giveaway_id, user_ids):
+    """Пользователи из списка (без повторов), еще не участвующие в розыгрыше"""
+    existing = set()
+    for chunk in _chunks(user_ids, ENROLL_BATCH_SIZE):
+        existing.update(
+            Participant.objects.filter(giveaway_id=giveaway_id, user_id__in=chunk)
+            .values_list('user_id', flat=True)
+        )
+    return [user_id for user_id in dict.fromkeys(user_ids) if user_id not in existing]
+
+
+def _insert_participants(giveaway_id, user_ids):
+    """
+    bulk_create новых участников внутри транзакции вызывающего.
+    Вызывающий держит блокировку строки розыгрыша и уже отсеял участников
+    (_without_participants), поэтому конфликтов нет и счетчик растет ровно
+    на len(user_ids); ignore_conflicts молча разошелся бы со счетчиком.
+    """
+    if not user_ids:
+        return
+    Participant.objects.bulk_create(
+        (Participant(user_id=user_id, giveaway_id=giveaway_id) for user_id in user_ids),
+        batch_size=ENROLL_BATCH_SIZE,
+    )
+    # bulk_create не вызывает сигналы: счетчик и кеш обновляем сами
+    Giveaway.objects.filter(pk=giveaway_id).update(
+        participants_count=F('participants_count') + len(user_ids)
+    )
+    transaction.on_commit(lambda: invalidate_participations(giveaway_id, user_ids))
+
+
+def bulk_enroll(giveaway_id, user_ids=(), usernames=()):
+    """
+    Массовая регистрация участников пачками bulk_create.
+    Учитывает max_participants и draw_time, возвращает отчет
+    accepted / duplicates / rejected (с причинами).
+    """
+    report = {
+        'accepted': 0,
+        'duplicates': 0,
+        'rejected': 0,
+        'rejected_reasons': {'unknown_user': 0, 'full': 0, 'closed': 0},
+    }
+    resolved, unknown = _resolve_user_ids(user_ids, usernames)
+    report['rejected_reasons']['unknown_user'] = unknown
+
+    # Повторы внутри самого запроса - тоже дубликаты
+    candidates = list(dict.fromkeys(resolved))
+    report['duplicates'] = len(resolved) - len(candidates)
+
+    with transaction.atomic():
+        # Блокировка строки сериализует нас с join_giveaway, резервирующим места
+        giveaway = Giveaway.objects.select_for_update().only(
+            'is_active', 'draw_time', 'max_participants', 'participants_count'
+        ).get(pk=giveaway_id)
+
+        if not giveaway.is_active or giveaway.draw_time < timezone.now():
+            report['rejected_reasons']['closed'] = len(candidates)
+            candidates = []
+
+        new_user_ids = _without_participants(giveaway_id, candidates)
+        report['duplicates'] += len(candidates) - len(new_user_ids)
+
+        if giveaway.max_participants:
+            free_seats = max(giveaway.max_participants - giveaway.participants_count, 0)
+            report['rejected_reasons']['full'] = max(len(new_user_ids) - free_seats, 0)
+            new_user_ids = new_user_ids[:free_seats]
+
+        _insert_participants(giveaway_id, new_user_ids)
+
+    report['accepted'] = len(new_user_ids)
+    report['rejected'] = sum(report['rejected_reasons'].values())
+    logger.info(f"Массовая регистрация в розыгрыш {giveaway_id}: {report}")
+    return report
+
+
+def buffered_join(giveaway_id, user):
+    """
+    Вступление в розыгрыш с buffered_joins: проверки по кешу карточки и буферу,
+    без записи в БД. Participant появится после flush_buffered_joins.
+    Лимит мест точен для Redis-буфера; локальный буфер учитывает только свой процесс.
+    """
+    data = get_giveaway_data(giveaway_id)
+    if data is None:
+        return JOIN_NOT_FOUND
+    if not data['is_active'] or parse_datetime(data['draw_time']) < timezone.now():
+        return JOIN_CLOSED
+    giveaway_id = data['id']  # ключ буфера - int, а из URL приходит строка
+
+    buffer = get_join_buffer()
+    if buffer.contains(giveaway_id, user.id) or Participant.objects.filter(giveaway_id=giveaway_id, user=user).exists():
+        return JOIN_ALREADY_JOINED
+
+    free_seats = None
+    if data['max_participants']:
+        participants_count = Giveaway.objects.filter(pk=giveaway_id).values_list('participants_count', flat=True).first()
+        free_seats = max(data['max_participants'] - (participants_count or 0), 0)
+
+    result = buffer.add(giveaway_id, user.id, free_seats)
+    if result == BUFFER_DUPLICATE:
+        return JOIN_ALREADY_JOINED
+    if result != BUFFER_ADDED:
+        return JOIN_FULL
+    _start_join_flusher()
+    return JOIN_QUEUED
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_joins_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            for giveaway_id in get_join_buffer().pending_giveaway_ids():
+                flush_buffered_joins(giveaway_id)
+        except Exception:
+            logger.exception("Ошибка фоновой записи буфера вступлений")
+        finally:
+            close_old_connections()
+
+
+def _start_join_flusher():
+    """
+    Фоновый поток процесса: локальный буфер (и резерв при сбое Redis) виден
+    только своему процессу, поэтому Celery-воркер сам его записать не может.
+    """
+    global _flusher
+    interval = settings.JOIN_BUFFER_FLUSH_INTERVAL
+    if interval <= 0:
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_flush_joins_forever, args=(interval,), name='join-buffer-flush', daemon=True
+            )
+            _flusher.start()
+
+
+def join_buffer_needs_flush(giveaway_id):
+    return get_join_buffer().pending_count(giveaway_id) >= settings.JOIN_BUFFER_FLUSH_SIZE
+
+
+def flush_buffered_joins(giveaway_id):
+    """
+    Переносит ожидающие вступления в Participant пачками bulk_create.
+    Пачка убирается из буфера только после коммита: при сбое она запишется
+    повторно, а уже существующие участники будут пропущены. Внутри внешней
+    транзакции (розыгрыш) подтверждения ждут ее коммита, при откате
+    вступления остаются в буфере.
+    """
+    queues = get_join_buffer().queues()
+    inserted = 0
+    offsets = [0] * len(queues)  # записанные, но еще не подтвержденные вступления по очередям
+    # Проходы повторяются, пока есть что записывать: вступление могло попасть
+    # в уже пройденную очередь (запасной локальный буфер при сбое Redis)
+    progressed = True
+    while progressed:
+        progressed = False
+        for index, queue in enumerate(queues):
+            while queue.pending(giveaway_id, 1, offsets[index]):
+                with transaction.atomic():
+                    # Блокировка строки: один flush за раз и не одновременно с розыгрышем
+                    is_active = (
+                        Giveaway.objects.select_for_update().filter(pk=giveaway_id)
+                        .values_list('is_active', flat=True).first()
+                    )
+                    user_ids = queue.pending(giveaway_id, ENROLL_BATCH_SIZE, offsets[index])
+                    if not user_ids:
+                        break
+                    if is_active:
+                        new_user_ids = _without_participants(giveaway_id, user_ids)
+                        _insert_participants(giveaway_id, new_user_ids)
+                        inserted += len(new_user_ids)
+                    else:
+                        logger.warning(f"Розыгрыш {giveaway_id} завершен или удален, отброшено вступлений: {len(user_ids)}")
+                    # Пачка подтверждается в той же очереди, из которой прочитана
+                    transaction.on_commit(partial(queue.ack, giveaway_id, len(user_ids)))
+                progressed = True
+                if transaction.get_connection().in_atomic_block:
+                    offsets[index] += len(user_ids)
+    return inserted
+
+
+# Размер пачки при массовой записи победителей
+WINNERS_BATCH_SIZE = 1000
+
+
+def prize_slots(giveaway, tiers=None):
+    """Призовые места [(уровень или None, число победителей)] в порядке розыгрыша"""
+    if tiers is None:
+        tiers = list(giveaway.prize_tiers.all())
+    if not tiers:
+        return [(None, giveaway.winners_count)]
+    return [(tier, tier.winners_count) for tier in tiers]
+
+
+def get_winners_payload(giveaway_id):
+    """Данные победителей одним запросом с JOIN на участника и пользователя"""
+    rows = (
+        Winner.objects.filter(giveaway_id=giveaway_id)
+        .order_by('id')
+        .values_list('participant__user_id', 'participant__user__username', 'participant__user__email', 'tier__name')
+        .iterator(chunk_size=DRAW_CHUNK_SIZE)
+    )
+    return [
+        {'id': user_id, 'username': username, 'email': email, 'tier': tier}
+        for user_id, username, email, tier in rows
+    ]
+
+
+def _existing_participant_ids(giveaway, participant_ids):
+    """Отбрасывает участников, удаленных после выборки; порядок сохраняется"""
+    existing = set()
+    for chunk in _chunks(participant_ids, WINNERS_BATCH_SIZE):
+        existing.update(giveaway.participants.filter(id__in=chunk).values_list('id', flat=True))
+    return [participant_id for participant_id in participant_ids if participant_id in existing]
+
+
+def perform_giveaway_draw(giveaway_id, check_draw_time=True, winner_ids=None, seed=None, snapshot=None):
     """
     Синхронное проведение розыгрыша
-    Для использования на PythonAnywhere вместо Celery
+    Для использования на PythonAnywhere вместо Celery.
+    Единая точка входа и для Celery-задачи schedule_giveaway_draw:
+    организатор может запустить розыгрыш досрочно (check_draw_time=False).
+    winner_ids - победители, выбранные заранее по seed (шардированный розыгрыш),
+    snapshot - participants_snapshot на момент их выборки.
     """
     try:
-        giveaway = Giveaway.objects.get(id=giveaway_id)
-        
-        # Проверки
-        if not giveaway.is_active:
-            return False, "Розыгрыш уже завершен"
-        
-        if giveaway.draw_time > timezone.now():
-            return False, "Время розыгрыша еще не наступило"
-        
-        participants = list(giveaway.participants.all())
-        
-        if not participants:
-            return False, "Нет участников для розыгрыша"
-        
-        # Проверяем, нет ли уже победителей
-        if giveaway.winners.exists():
-            return False, "Розыгрыш уже проведен"
-        
-        # Определяем количество победителей
-        winners_count = min(giveaway.winners_count, len(participants))
-        
-        # Выбираем случайных победителей
-        selected_winners = random.sample(participants, winners_count)
-        
-        # Создаем записи победителей в транзакции
         with transaction.atomic():
-            winners_list = []
-            for participant in selected_winners:
-                winner = Winner.objects.create(
-                    participant=participant,
-                    giveaway=giveaway,
-                    prize_description=f"Победитель розыгрыша '{giveaway.title}'"
+            # Блокируем строку, чтобы параллельный запуск не провел розыгрыш дважды
+            giveaway = Giveaway.objects.select_for_update().get(id=giveaway_id)
+            
+            # Проверки
+            if not giveaway.is_active:
+                return False, "Розыгрыш уже завершен"
+            
+            if check_draw_time and giveaway.draw_time > timezone.now():
+                return False, "Время розыгрыша еще не наступило"
+            
+            # Проверяем, нет ли уже победителей
+            if giveaway.winners.exists():
+                return False, "Розыгрыш уже проведен"
+            
+            # Принятые через буфер вступления должны попасть в розыгрыш
+            if giveaway.buffered_joins:
+                if get_join_buffer().foreign_pending(giveaway.id):
+                    return False, DRAW_JOINS_PENDING
+                flushed = flush_buffered_joins(giveaway.id)
+                if flushed and winner_ids is not None:
+                    # Готовая выборка их не видела: записанные участники остаются, выборку повторит вызывающий
+                    return False, DRAW_SAMPLE_STALE
+            
+            if snapshot is not None and participants_snapshot(giveaway.id) != list(snapshot):
+                # Участники вступили или удалены после выборки: шансы у них были не те
+                return False, DRAW_SAMPLE_STALE
+            
+            slots = prize_slots(giveaway)
+            winners_requested = sum(count for _, count in slots)
+            if seed is None:
+                seed = new_seed()
+            if winner_ids is None:
+                # Выбираем победителей по ID за один проход, модели участников не загружаем
+                winner_ids, digest = draw_pass(giveaway.id, seed, winners_requested)
+            else:
+                winner_ids = _existing_participant_ids(giveaway, list(winner_ids))
+                digest = participants_digest(giveaway.id)
+            
+            if not winner_ids:
+                return False, "Нет участников для розыгрыша"
+            
+            winners_count = len(winner_ids)
+            # Победители идут в порядке вытягивания: первые получают старшие призы
+            remaining = iter(winner_ids)
+            winners = []
+            for tier, count in slots:
+                if tier is None:
+                    prize_description = f"Победитель розыгрыша '{giveaway.title}'"
+                else:
+                    prize_description = f"{tier.name} - розыгрыш '{giveaway.title}'"
+                winners.extend(
+                    Winner(participant_id=participant_id, giveaway=giveaway, tier=tier, prize_description=prize_description)
+                    for participant_id in islice(remaining, count)
                 )
-                winners_list.append({
-                    'id': participant.user.id,
-                    'username': participant.user.username,
-                    'email': participant.user.email
-                })
+            Winner.objects.bulk_create(winners, batch_size=WINNERS_BATCH_SIZE)
+            # Повторный розыгрыш (победители сброшены в админке) заменяет прежний аудит
+            replaced, _ = DrawAudit.objects.filter(giveaway=giveaway).delete()
+            if replaced:
+                logger.warning(f"Розыгрыш {giveaway_id} проведен повторно, прежний аудит заменен")
+            DrawAudit.objects.create(
+                giveaway=giveaway,
+                algorithm=DRAW_ALGORITHM,
+                seed=seed,
+                participants_digest=digest.hexdigest(),
+                participants_count=digest.count,
+                winners_requested=winners_requested,
+                winner_ids=winner_ids,
+            )
             
             # Деактивируем розыгрыш после проведения
             giveaway.is_active = False
-            giveaway.save()
+            giveaway.save(update_fields=['is_active'])
+        
+        if giveaway.buffered_joins:
+            get_join_buffer().forget(giveaway.id)
+        winners_list = get_winners_payload(giveaway.id)
+        # bulk_create не вызывает сигналы: отметка о выигрыше в индексах участий
+        invalidate_participation_indexes({winner['id'] for winner in winners_list})
         
         logger.info(f"Розыгрыш {giveaway_id} завершен. Выбрано {winners_count} победителей")
         return True, {
@@ -69,4 +496,82 @@ def perform_giveaway_draw(giveaway_id):
     except Exception as e:
         error_msg = f"Ошибка при проведении розыгрыша: {str(e)}"
         logger.error(error_msg)
-        return False, error_msg
\ No newline at end of file
+        return False, error_msg
+
+
+def verify_draw(giveaway_id):
+    """
+    Повторяет проведенный розыгрыш по сохраненному seed одним потоковым проходом
+    и сверяет дайджест участников и победителей с DrawAudit.
+    """
+    giveaway_id = giveaway_pk(giveaway_id)
+    if giveaway_id is None:
+        raise DrawAudit.DoesNotExist
+    audit = DrawAudit.objects.get(giveaway_id=giveaway_id)
+    report = {
+        'algorithm': audit.algorithm,
+        # Строкой: 63-битный seed не помещается в число JavaScript
+        'seed': str(audit.seed),
+        'participants_digest': audit.participants_digest,
+        'participants_count': audit.participants_count,
+        'winner_ids': audit.winner_ids,
+        'drawn_at': audit.created_at,
+    }
+    if audit.algorithm != DRAW_ALGORITHM:
+        report.update(verified=False, reason=f"Алгоритм {audit.algorithm} не поддерживается")
+        return report
+
+    winner_ids, digest = draw_pass(giveaway_id, audit.seed, audit.winners_requested)
+    report['digest_matches'] = digest.hexdigest() == audit.participants_digest
+    report['winners_match'] = winner_ids == audit.winner_ids
+    report['verified'] = report['digest_matches'] and report['winners_match']
+    if not report['digest_matches']:
+        report['reason'] = "Набор участников изменился после розыгрыша"
+    elif not report['winners_match']:
+        report['reason'] = "Пересчитанные победители не совпадают с сохраненными"
+    return report
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def _password_hash_pool():
+    """Потоки хеширования паролей: не больше PASSWORD_HASH_WORKERS хешей одновременно"""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash'
+            )
+        return _hash_pool
+
+
+def _create_user_with_token(username, email, password_hash):
+    # Два INSERT в одной транзакции: без SELECT токена и без второго сохранения пользователя
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        password=password_hash,
+    )
+    with transaction.atomic():
+        user.save(force_insert=True)
+        token = Token.objects.create(user=user)
+    return user, token
+
+
+def register_user(username, email, password):
+    """
+    Создает пользователя и его токен. Пароль хешируется в общем пуле потоков:
+    одновременных хешей не больше, чем потоков пула, сколько бы ни было запросов.
+    IntegrityError при занятом имени пробрасывается.
+    """
+    password_hash = _password_hash_pool().submit(make_password, password).result()
+    return _create_user_with_token(username, email, password_hash)
+
+
+async def aregister_user(username, email, password):
+    """Вариант register_user для ASGI: цикл событий не ждет хеширования"""
+    password_hash = await asyncio.wrap_future(_password_hash_pool().submit(make_password, password))
+    # Транзакции в async-коде недоступны, поэтому запись - в потоке ORM
+    return await sync_to_async(_create_user_with_token)(username, email, password_hash)
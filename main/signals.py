@@ -0,0 +1,132 @@
+# signals.py
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import DrawAudit, Giveaway, Participant, Winner
+from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+from .cache import (
+    invalidate_all_participation_indexes, invalidate_giveaway, invalidate_join_code, invalidate_participation,
+    invalidate_user_participations,
+)
+
+
+@receiver(post_save, sender=Participant)
+def increment_participants_count(sender, instance, created, **kwargs):
+    """Атомарно увеличивает счетчик участников при создании записи"""
+    # join_giveaway резервирует место сам и помечает запись
+    if created and not getattr(instance, '_seat_reserved', False):
+        Giveaway.objects.filter(pk=instance.giveaway_id).update(
+            participants_count=F('participants_count') + 1
+        )
+
+
+def _cascaded_from(origin, *models):
+    """
+    Удаление пришло каскадом от объекта или QuerySet одной из моделей. Такие
+    удаления обрабатываются один раз на исходный объект, а не на каждую строку.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(post_delete, sender=Participant)
+def decrement_participants_count(sender, instance, origin=None, **kwargs):
+    """Атомарно уменьшает счетчик участников при удалении записи"""
+    # Удаленному розыгрышу счетчик не нужен, удаление пользователя - release_user_participations
+    if _cascaded_from(origin, Giveaway, User):
+        return
+    Giveaway.objects.filter(pk=instance.giveaway_id, participants_count__gt=0).update(
+        participants_count=F('participants_count') - 1
+    )
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def invalidate_participant_cache(sender, instance, origin=None, **kwargs):
+    if _cascaded_from(origin, Giveaway, User):
+        return
+    # После коммита: иначе параллельный запрос успеет закешировать старые данные
+    transaction.on_commit(partial(invalidate_participation, instance.giveaway_id, instance.user_id))
+
+
+@receiver(post_save, sender=Giveaway)
+@receiver(post_delete, sender=Giveaway)
+@receiver(post_save, sender=Winner)
+@receiver(post_delete, sender=Winner)
+@receiver(post_save, sender=DrawAudit)
+@receiver(post_delete, sender=DrawAudit)
+def invalidate_giveaway_cache(sender, instance, origin=None, **kwargs):
+    if sender is not Giveaway and _cascaded_from(origin, Giveaway, Participant, User):
+        return
+    giveaway_id = instance.pk if sender is Giveaway else instance.giveaway_id
+    transaction.on_commit(partial(invalidate_giveaway, giveaway_id))
+
+
+@receiver(post_save, sender=Winner)
+@receiver(post_delete, sender=Winner)
+def invalidate_winner_participations(sender, instance, origin=None, **kwargs):
+    # Победители розыгрыша пишутся bulk_create, сюда попадают только правки из админки.
+    # Пользователь победителя без запроса не известен - сбрасываются все индексы
+    if not _cascaded_from(origin, Giveaway, Participant, User):
+        transaction.on_commit(invalidate_all_participation_indexes)
+
+
+@receiver(post_delete, sender=Giveaway)
+def invalidate_deleted_giveaway_participations(sender, instance, **kwargs):
+    # Участники удалены каскадом без сигналов на каждую строку
+    transaction.on_commit(invalidate_all_participation_indexes)
+
+
+@receiver(pre_delete, sender=User)
+def release_user_participations(sender, instance, **kwargs):
+    """Места удаляемого пользователя освобождаются одним UPDATE, а не по строке на участие"""
+    giveaway_ids = list(instance.participations.values_list('giveaway_id', flat=True))
+    if giveaway_ids:
+        Giveaway.objects.filter(pk__in=giveaway_ids, participants_count__gt=0).update(
+            participants_count=F('participants_count') - 1
+        )
+        transaction.on_commit(partial(invalidate_user_participations, instance.pk, giveaway_ids))
+
+
+@receiver(pre_save, sender=Giveaway)
+def remember_old_index_fields(sender, instance, update_fields=None, **kwargs):
+    # При смене кода надо сбросить и старый ключ индекса кодов, при смене
+    # времени розыгрыша - индексы участий, упорядоченные по нему
+    if instance.pk is not None and (update_fields is None or {'join_code', 'draw_time'} & set(update_fields)):
+        old = Giveaway.objects.filter(pk=instance.pk).values('join_code', 'draw_time').first() or {}
+        instance._old_join_code = old.get('join_code')
+        instance._old_draw_time = old.get('draw_time')
+
+
+@receiver(post_save, sender=Giveaway)
+@receiver(post_delete, sender=Giveaway)
+def invalidate_join_code_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_join_code, instance.join_code))
+    old_join_code = getattr(instance, '_old_join_code', None)
+    if old_join_code and old_join_code != instance.join_code:
+        transaction.on_commit(partial(invalidate_join_code, old_join_code))
+
+
+@receiver(post_save, sender=Giveaway)
+def invalidate_participations_order(sender, instance, **kwargs):
+    old_draw_time = getattr(instance, '_old_draw_time', None)
+    if old_draw_time is not None and old_draw_time != instance.draw_time:
+        transaction.on_commit(invalidate_all_participation_indexes)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user_tokens(sender, instance, **kwargs):
+    # Деактивация или смена данных пользователя сбрасывает его токены
+    token_cache.invalidate_user(instance.pk)
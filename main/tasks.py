@@ -1,49 +1,149 @@
-from celery import shared_task
+from datetime import timedelta
+from celery import chord, group, shared_task
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
-from .models import Giveaway, Participant, Winner
-import random
+from django.db.models import Q
+from .models import Giveaway
+from .join_buffer import get_join_buffer
+from .services import DRAW_JOINS_PENDING, DRAW_SAMPLE_STALE, flush_buffered_joins, perform_giveaway_draw, prize_slots
+from .draw import DRAW_SHARD_SIZE, merge_shards, new_seed, participants_snapshot, sample_shard, shard_ranges
+
+# Сколько розыгрышей планировщик забирает за одну транзакцию
+SCHEDULER_BATCH_SIZE = 200
+# Сколько пачек обрабатывается за один тик beat
+SCHEDULER_MAX_BATCHES = 25
+# Через сколько неудавшаяся отправка снова считается свободной
+DRAW_DISPATCH_TIMEOUT = timedelta(minutes=10)
+# Сколько раз шардированный розыгрыш пересчитывается, если участники менялись во время выборки
+DRAW_MAX_RESAMPLES = 5
+
+
+def release_draw_dispatch(giveaway_id):
+    """Розыгрыш отложен: следующий тик планировщика заберет его снова"""
+    Giveaway.objects.filter(pk=giveaway_id, is_active=True).update(draw_dispatched_at=None)
 
 @shared_task
 def schedule_giveaway_draw(giveaway_id):
     """Фоновая задача для проведения розыгрыша"""
-    try:
-        giveaway = Giveaway.objects.get(id=giveaway_id)
-        
-        with transaction.atomic():
-            participants = list(giveaway.participants.all())
-            
-            if not participants:
-                return "Нет участников для розыгрыша"
-            
-            # Безопасный случайный выбор
-            winners_count = min(giveaway.winners_count, len(participants))
-            winners = random.sample(participants, winners_count)
-            
-            # Создание записей победителей
-            for participant in winners:
-                Winner.objects.create(
-                    participant=participant,
-                    giveaway=giveaway
-                )
-            
-            # Деактивируем розыгрыш после проведения
-            giveaway.is_active = False
-            giveaway.save()
-        
-        return f"Определено {len(winners)} победителей"
-    
-    except Giveaway.DoesNotExist:
-        return "Розыгрыш не найден"
+    participants_count = (
+        Giveaway.objects.filter(pk=giveaway_id).values_list('participants_count', flat=True).first()
+    )
+    if participants_count is not None and participants_count >= settings.DRAW_SHARD_THRESHOLD:
+        return sharded_giveaway_draw(giveaway_id)
+
+    # Организатор может запустить розыгрыш досрочно через draw_winner
+    success, result = perform_giveaway_draw(giveaway_id, check_draw_time=False)
+    if success:
+        return result['message']
+    if result == DRAW_JOINS_PENDING:
+        release_draw_dispatch(giveaway_id)
+    return result
+
+@shared_task
+def draw_shard(giveaway_id, seed, k, lo, hi):
+    """k наибольших ключей среди участников с ID в [lo, hi)"""
+    return sample_shard(giveaway_id, seed, k, lo, hi)
+
+
+@shared_task
+def finish_sharded_draw(shard_results, giveaway_id, k, seed, snapshot=None, attempt=0):
+    """Reduce шардированного розыгрыша: глобальные k победителей и их запись"""
+    winner_ids = merge_shards(shard_results, k)
+    success, result = perform_giveaway_draw(
+        giveaway_id, check_draw_time=False, winner_ids=winner_ids, seed=seed, snapshot=snapshot
+    )
+    if success:
+        return result['message']
+    if result == DRAW_SAMPLE_STALE:
+        # Участники изменились после выборки: шарды считаются заново
+        if attempt < DRAW_MAX_RESAMPLES:
+            sharded_giveaway_draw.delay(giveaway_id, seed, attempt=attempt + 1)
+        else:
+            release_draw_dispatch(giveaway_id)
+    elif result == DRAW_JOINS_PENDING:
+        release_draw_dispatch(giveaway_id)
+    return result
+
+
+@shared_task
+def sharded_giveaway_draw(giveaway_id, seed=None, shard_size=DRAW_SHARD_SIZE, attempt=0):
+    """
+    Розыгрыш для миллионов участников: шарды по диапазонам ID выполняются
+    параллельно (chord), победители при одном seed не зависят от числа шардов.
+    Вне eager-режима chord требует result backend (CELERY_RESULT_BACKEND).
+    """
+    giveaway = Giveaway.objects.filter(pk=giveaway_id, is_active=True).first()
+    if giveaway is None:
+        return f"Розыгрыш {giveaway_id} не найден или уже завершен"
+    if giveaway.buffered_joins:
+        if get_join_buffer().foreign_pending(giveaway_id):
+            # Выборка без этих вступлений все равно была бы отклонена
+            release_draw_dispatch(giveaway_id)
+            return DRAW_JOINS_PENDING
+        # Буфер записывается до выборки: шарды должны видеть всех принятых участников
+        if flush_buffered_joins(giveaway_id):
+            giveaway.refresh_from_db(fields=['participants_count'])
+    if seed is None:
+        seed = new_seed()
+
+    k = sum(count for _, count in prize_slots(giveaway))
+    # Снимок до границ шардов: вступивший после него участник изменит снимок в reduce
+    snapshot = participants_snapshot(giveaway_id)
+    ranges = shard_ranges(giveaway_id, giveaway.participants_count, shard_size)
+    if not ranges:
+        return finish_sharded_draw([], giveaway_id, k, seed, snapshot, attempt)
+    chord(draw_shard.s(giveaway_id, seed, k, lo, hi) for lo, hi in ranges)(
+        finish_sharded_draw.s(giveaway_id, k, seed, snapshot, attempt)
+    )
+    return f"Розыгрыш {giveaway_id}: {len(ranges)} шардов"
+
+
+@shared_task
+def flush_join_buffer(giveaway_id):
+    """Запись накопленных в буфере вступлений одного розыгрыша"""
+    return flush_buffered_joins(giveaway_id)
+
+
+@shared_task
+def flush_join_buffers():
+    """Периодическая запись буферов вступлений всех розыгрышей"""
+    flushed = sum(flush_buffered_joins(giveaway_id) for giveaway_id in get_join_buffer().pending_giveaway_ids())
+    return f"Записано вступлений из буфера: {flushed}"
+
+
+def claim_due_giveaways(now, limit=SCHEDULER_BATCH_SIZE):
+    """
+    Забирает пачку розыгрышей, время которых наступило, и помечает их как отправленные.
+    Строки, заблокированные параллельным тиком планировщика, пропускаются.
+    Зависшие отправки (воркер упал) забираются повторно по таймауту.
+    """
+    stale_before = now - DRAW_DISPATCH_TIMEOUT
+    with transaction.atomic():
+        giveaway_ids = list(
+            Giveaway.objects.select_for_update(skip_locked=True)
+            .filter(is_active=True, draw_time__lte=now)
+            .filter(Q(draw_dispatched_at__isnull=True) | Q(draw_dispatched_at__lt=stale_before))
+            .order_by('draw_time', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if giveaway_ids:
+            Giveaway.objects.filter(id__in=giveaway_ids).update(draw_dispatched_at=now)
+    return giveaway_ids
+
 
 @shared_task
 def check_scheduled_giveaways():
     """Периодическая проверка розыгрышей по расписанию"""
     now = timezone.now()
-    active_giveaways = Giveaway.objects.filter(
-        is_active=True,
-        draw_time__lte=now
-    )
+    dispatched = 0
+    
+    # Ограничиваем число пачек за тик, остаток заберет следующий тик
+    for _ in range(SCHEDULER_MAX_BATCHES):
+        giveaway_ids = claim_due_giveaways(now)
+        if not giveaway_ids:
+            break
+        group(schedule_giveaway_draw.s(giveaway_id) for giveaway_id in giveaway_ids).apply_async()
+        dispatched += len(giveaway_ids)
     
-    for giveaway in active_giveaways:
-        schedule_giveaway_draw.delay(giveaway.id)
\ No newline at end of file
+    return f"Отправлено розыгрышей: {dispatched}"
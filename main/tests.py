@@ -1,3 +1,945 @@
-from django.test import TestCase
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from celery.contrib.testing.worker import start_worker
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, TestCase as DjangoTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from config.celery import app
+
+from .authentication import token_cache
+from .metrics import registry
+from .throttling import get_bucket_store, throttle_stats
+from .models import DrawAudit, Giveaway, Participant, PrizeTier, Winner
+from . import draw, join_buffer
+from .draw import draw_keys, largest_keys, merge_shards, participants_snapshot, sample_shard, splitmix64
+from .tasks import (
+    check_scheduled_giveaways, claim_due_giveaways, finish_sharded_draw, schedule_giveaway_draw, sharded_giveaway_draw,
+)
+from .services import (
+    DRAW_JOINS_PENDING, DRAW_SAMPLE_STALE, buffered_join, bulk_enroll, flush_buffered_joins, perform_giveaway_draw, join_giveaway, verify_draw, JOIN_OK, JOIN_QUEUED, JOIN_ALREADY_JOINED, JOIN_FULL, JOIN_CLOSED, JOIN_NOT_FOUND,
+)
+
+
+class TestCase(DjangoTestCase):
+    """Кеш процесса и корзины троттлинга не откатываются вместе с транзакцией теста"""
+    def _pre_setup(self):
+        super()._pre_setup()
+        cache.clear()
+        get_bucket_store().clear()
+        throttle_stats.clear()
+
+
+def make_giveaway(organizer, **kwargs):
+    defaults = {
+        'title': 'Розыгрыш',
+        'join_code': f'CODE{Giveaway.objects.count()}',
+        'draw_time': timezone.now() + timedelta(days=1),
+        'created_by': organizer,
+    }
+    defaults.update(kwargs)
+    return Giveaway.objects.create(**defaults)
+
+
+class JoinGiveawayTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.user = User.objects.create_user('player')
+
+    def test_join_statuses(self):
+        giveaway = make_giveaway(self.organizer, max_participants=1)
+        other = User.objects.create_user('other')
+
+        self.assertEqual(join_giveaway(giveaway.pk, self.user), JOIN_OK)
+        self.assertEqual(join_giveaway(giveaway.pk, self.user), JOIN_ALREADY_JOINED)
+        self.assertEqual(join_giveaway(giveaway.pk, other), JOIN_FULL)
+        self.assertEqual(join_giveaway(giveaway.pk + 100, other), JOIN_NOT_FOUND)
+        self.assertEqual(join_giveaway('abc', other), JOIN_NOT_FOUND)
+
+        closed = make_giveaway(self.organizer, draw_time=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(join_giveaway(closed.pk, other), JOIN_CLOSED)
+
+        giveaway.refresh_from_db()
+        self.assertEqual(giveaway.participants_count, 1)
+
+    def test_enter_endpoint(self):
+        giveaway = make_giveaway(self.organizer)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post(f'/api/giveaways/{giveaway.pk}/enter/')
+        self.assertEqual(response.status_code, 201)
+
+        response = client.post(f'/api/giveaways/{giveaway.pk}/enter/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['status'], JOIN_ALREADY_JOINED)
+
+        self.assertEqual(client.post('/api/giveaways/abc/enter/').status_code, 404)
+
+        # Режим buffered_joins не читается заранее: резерв места и вставка участника
+        client.force_authenticate(User.objects.create_user('other'))
+        cache.clear()
+        with self.assertNumQueries(4):
+            self.assertEqual(client.post(f'/api/giveaways/{giveaway.pk}/enter/').status_code, 201)
+
+
+class GiveawayListQueryCountTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.user = User.objects.create_user('player')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_joined_giveaways(self, count):
+        # Кеш сбрасывается сигналами после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                giveaway = make_giveaway(self.organizer)
+                Participant.objects.create(user=self.user, giveaway=giveaway)
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        # Лента: страница + флаги участия; мои участия: индекс участий + карточки, которых нет в кеше
+        expected_queries = {'/api/giveaways/': 2, '/api/my-participations/': 2}
+
+        self.add_joined_giveaways(2)
+        for url, queries in expected_queries.items():
+            with self.subTest(url=url, rows=2):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.data['results']), 2)
+
+        self.add_joined_giveaways(10)
+        for url, queries in expected_queries.items():
+            with self.subTest(url=url, rows=12):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.data['results']), 12)
+
+        item = response.data['results'][0]
+        self.assertTrue(item['is_joined'])
+        self.assertFalse(item['is_creator'])
+        self.assertEqual(item['participants_count'], 1)
+        self.assertEqual(item['created_by']['username'], 'organizer')
+
+
+class GiveawayCacheTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.user = User.objects.create_user('player')
+        self.giveaway = make_giveaway(self.organizer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_detail_is_cached_and_invalidated(self):
+        url = f'/api/giveaways/{self.giveaway.pk}/'
+        response = self.client.get(url)
+        self.assertFalse(response.data['is_joined'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['participants_count'], 0)
+
+        # Кеш сбрасывается сигналами после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{url}enter/')
+        response = self.client.get(url)
+        self.assertTrue(response.data['is_joined'])
+        self.assertEqual(response.data['participants_count'], 1)
+
+        # Ключ кеша строится от числового ID: '0{pk}' - тот же розыгрыш
+        padded_url = f'/api/giveaways/0{self.giveaway.pk}/'
+        self.assertEqual(self.client.get(padded_url).data['title'], 'Розыгрыш')
+
+        Giveaway.objects.filter(pk=self.giveaway.pk).update(title='Без сигнала')
+        self.giveaway.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.giveaway.save()
+            # До коммита кеш не сбрасывается
+            self.assertEqual(self.client.get(url).data['title'], 'Розыгрыш')
+        self.assertTrue(callbacks)
+        self.assertEqual(self.client.get(url).data['title'], 'Новое название')
+        self.assertEqual(self.client.get(padded_url).data['title'], 'Новое название')
+
+        self.client.force_authenticate(self.organizer)
+        self.assertTrue(self.client.get(url).data['is_creator'])
+
+    def test_list_is_cached_until_giveaway_changes(self):
+        self.client.get('/api/giveaways/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/giveaways/')
+        self.assertEqual(len(response.data['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_giveaway(self.organizer)
+        self.assertEqual(len(self.client.get('/api/giveaways/').data['results']), 2)
+
+
+    def test_join_by_code_uses_code_index(self):
+        url = '/api/giveaways/join-by-code/'
+        other = User.objects.create_user('other')
+        response = self.client.post(url, {'join_code': self.giveaway.join_code})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['giveaway'], self.giveaway.pk)
+        self.assertEqual(self.client.post(url, {'join_code': 'NOPE'}).status_code, 404)
+
+        # Розыгрыш не читается: только резерв места и вставка участника
+        self.client.force_authenticate(other)
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.post(url, {'join_code': self.giveaway.join_code}).status_code, 201)
+
+        old_code = self.giveaway.join_code
+        self.giveaway.join_code = 'RENAMED'
+        self.giveaway.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.giveaway.save()
+        self.assertEqual(self.client.post(url, {'join_code': old_code}).status_code, 404)
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'join_code': 'RENAMED'})
+        self.assertEqual(response.data['status'], JOIN_CLOSED)
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'join_user': '2/min', 'join_ip': '100/min', 'join_giveaway': '3/min', 'auth_ip': '1/min'},
+})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.giveaway = make_giveaway(self.organizer)
+        self.url = f'/api/giveaways/{self.giveaway.pk}/enter/'
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_join_is_limited_per_user_and_per_giveaway(self):
+        client = self.client_for(User.objects.create_user('player'))
+        self.assertEqual(client.post(self.url).status_code, 201)
+        self.assertEqual(client.post(self.url).status_code, 400)
+        response = client.post(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        # Третий токен корзины розыгрыша ушел на запрос, отклоненный по пользователю
+        other = self.client_for(User.objects.create_user('other'))
+        with self.assertNumQueries(0):
+            self.assertEqual(other.post(self.url).status_code, 429)
+        self.assertEqual(throttle_stats.snapshot()['join_giveaway'], {'allowed': 3, 'throttled': 1})
+
+    async def test_async_join_uses_the_same_limits(self):
+        user = await User.objects.acreate(username='player')
+        token = await Token.objects.acreate(user=user)
+        await Giveaway.objects.filter(pk=self.giveaway.pk).aupdate(max_participants=1)
+        client = AsyncClient()
+        url = f'/api/async/giveaways/{self.giveaway.pk}/enter/'
+        headers = {'Authorization': f'Token {token.key}'}
+        self.assertEqual((await client.post(url, headers=headers)).status_code, 201)
+        self.assertEqual((await client.post(url, headers=headers)).status_code, 400)
+        response = await client.post(url, headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        # Корзина розыгрыша пуста: отказ еще до проверки токена
+        self.assertEqual((await client.post(url)).status_code, 429)
+
+    def test_auth_is_limited_per_ip_before_hashing(self):
+        User.objects.create_user('player', password='secret-password')
+        credentials = {'username': 'player', 'password': 'secret-password'}
+        self.assertEqual(self.client.post('/api/auth/token/', credentials).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post('/api/auth/token/', credentials).status_code, 429)
+            self.assertEqual(self.client.post('/api/auth/register/', credentials).status_code, 429)
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        body = self.client_for(staff).get('/api/metrics/').content.decode()
+        self.assertIn('giveaway_throttle_rejected_total{scope="auth_ip"} 2', body)
+
+
+class ParticipationIndexTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.user = User.objects.create_user('player')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Порядок ленты - по draw_time, обратный порядку ID
+        now = timezone.now()
+        self.giveaways = [make_giveaway(self.organizer, draw_time=now + timedelta(days=3 - i)) for i in range(3)][::-1]
+
+    def ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_pages_follow_index_and_winner_status(self):
+        url = '/api/my-participations/'
+        with self.captureOnCommitCallbacks(execute=True):
+            for giveaway in self.giveaways:
+                join_giveaway(giveaway.pk, self.user)
+
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(self.ids(response), [g.pk for g in self.giveaways[:2]])
+        self.assertIsNone(response.data['previous'])
+        # Индекс уже в кеше: выбирается только карточка третьего розыгрыша
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(self.ids(response), [self.giveaways[2].pk])
+        self.assertIsNone(response.data['next'])
+        self.assertFalse(response.data['results'][0]['is_winner'])
+        self.assertEqual(self.ids(self.client.get(response.data['previous'])), [g.pk for g in self.giveaways[:2]])
+        self.assertEqual(self.client.get(url, {'cursor': 'bad'}).status_code, 404)
+
+        # Розыгрыш пишет победителей bulk_create, индекс сбрасывается явно
+        with self.captureOnCommitCallbacks(execute=True):
+            perform_giveaway_draw(self.giveaways[2].pk, check_draw_time=False)
+        item = self.client.get(url).data['results'][2]
+        self.assertTrue(item['is_winner'])
+        self.assertFalse(item['is_active'])
+
+        # Перенос розыгрыша меняет порядок во всех индексах
+        first = self.giveaways[0]
+        first.draw_time = timezone.now() + timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual(self.ids(self.client.get(url)), [g.pk for g in self.giveaways[1:]] + [first.pk])
+
+        # Массовая регистрация тоже обновляет индекс
+        fourth = make_giveaway(self.organizer)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_enroll(fourth.pk, user_ids=[self.user.pk])
+        self.assertEqual(len(self.client.get(url).data['results']), 4)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user('player')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_is_cached_and_revoked(self):
+        url = '/api/my-participations/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Ни запроса Token+User, ни выборки страницы: индекс участий тоже в кеше
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.token.delete()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_deactivated_user_is_dropped_from_cache(self):
+        self.client.get('/api/my-participations/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/my-participations/').status_code, 401)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1.0)
+class ProfilingMiddlewareTests(TestCase):
+    def test_metrics_are_collected_per_view(self):
+        registry.clear()
+        staff = User.objects.create_user('staff', is_staff=True)
+        giveaway = make_giveaway(staff)
+        client = APIClient()
+        client.force_authenticate(staff)
+        client.get(f'/api/giveaways/{giveaway.pk}/participants/')
+
+        response = client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('giveaway_db_queries_count{view="giveaway-participants"} 1', body)
+        self.assertIn('giveaway_request_duration_seconds_bucket{view="giveaway-participants",le="+Inf"} 1', body)
+        self.assertIn('giveaway_cache_hits_total{cache="detail"}', body)
+
+        client.force_authenticate(User.objects.create_user('player'))
+        self.assertEqual(client.get('/api/metrics/').status_code, 403)
+
+
+class ParticipantsPaginationTests(TestCase):
+    def test_participants_are_paged_by_cursor(self):
+        organizer = User.objects.create_user('organizer')
+        giveaway = make_giveaway(organizer)
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(5))
+        for user in users:
+            Participant.objects.create(user=user, giveaway=giveaway)
+
+        client = APIClient()
+        client.force_authenticate(organizer)
+        url = f'/api/giveaways/{giveaway.pk}/participants/?page_size=2'
+        seen = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['user']['username'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [user.username for user in users])
+
+
+class AsyncViewsTests(TestCase):
+    async def test_enter_detail_and_participants(self):
+        organizer = await User.objects.acreate(username='organizer')
+        user = await User.objects.acreate(username='player')
+        token = await Token.objects.acreate(user=user)
+        giveaway = await Giveaway.objects.acreate(
+            title='Розыгрыш', join_code='ASYNC', draw_time=timezone.now() + timedelta(days=1),
+            created_by=organizer, max_participants=1,
+        )
+        client = AsyncClient()
+        headers = {'Authorization': f'Token {token.key}'}
+        url = f'/api/async/giveaways/{giveaway.pk}/'
+
+        self.assertEqual((await client.get(url)).status_code, 401)
+
+        response = await client.post(f'{url}enter/', headers=headers)
+        self.assertEqual(response.status_code, 201)
+        response = await client.post(f'{url}enter/', headers=headers)
+        self.assertEqual(response.json()['status'], JOIN_ALREADY_JOINED)
+
+        data = (await client.get(url, headers=headers)).json()
+        self.assertTrue(data['is_joined'])
+        self.assertEqual(data['participants_count'], 1)
+
+        data = (await client.get(f'{url}participants/', headers=headers)).json()
+        self.assertEqual([item['user']['username'] for item in data['results']], ['player'])
+        self.assertIsNone(data['next'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistrationTests(TestCase):
+    payload = {'username': 'player', 'email': 'player@example.com', 'password': 'secret-password', 'password_confirm': 'secret-password'}
+
+    def test_registration_creates_user_and_token_together(self):
+        # Проверка уникальности имени, затем два INSERT в одной транзакции
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/auth/register/', self.payload)
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='player')
+        self.assertTrue(user.check_password('secret-password'))
+        self.assertEqual(response.data['token'], Token.objects.get(user=user).key)
+        self.assertEqual(self.client.post('/api/auth/register/', self.payload).status_code, 400)
+
+    async def test_async_registration(self):
+        client = AsyncClient()
+        response = await client.post('/api/async/auth/register/', self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        token = await Token.objects.select_related('user').aget(key=response.json()['token'])
+        self.assertEqual(token.user.username, 'player')
+        self.assertTrue(token.user.password.startswith('md5$'))
+
+        response = await client.post('/api/async/auth/register/', self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.json())
+
+
+class ExportTests(TestCase):
+    def test_streams_participants_as_csv_and_ndjson(self):
+        organizer = User.objects.create_user('organizer')
+        giveaway = make_giveaway(organizer)
+        for i in range(3):
+            Participant.objects.create(user=User.objects.create_user(f'user{i}'), giveaway=giveaway)
+
+        client = APIClient()
+        client.force_authenticate(organizer)
+        url = f'/api/giveaways/{giveaway.pk}/export/'
+
+        response = client.get(url, {'export_format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'participant_id,user_id,username,email,joined_at')
+        self.assertEqual(len(lines), 4)
+
+        response = client.get(url, {'export_format': 'ndjson', 'dataset': 'winners'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        client.force_authenticate(User.objects.get(username='user0'))
+        self.assertEqual(client.get(url).status_code, 403)
+        self.assertEqual(client.get('/api/giveaways/abc/export/').status_code, 404)
+
+
+class DrawTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.giveaway = make_giveaway(
+            self.organizer, winners_count=30, draw_time=timezone.now() - timedelta(minutes=1)
+        )
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(100))
+        Participant.objects.bulk_create(Participant(user=user, giveaway=self.giveaway) for user in users)
+
+    def test_draw_runs_constant_number_of_statements(self):
+        # SAVEPOINT, розыгрыш, проверка, уровни призов, ID участников, bulk_create,
+        # прежний аудит, аудит, UPDATE, RELEASE, выдача
+        with self.assertNumQueries(11):
+            success, result = perform_giveaway_draw(self.giveaway.pk)
+
+        self.assertTrue(success)
+        self.assertEqual(result['winners_count'], 30)
+        self.assertEqual(len({winner['id'] for winner in result['winners']}), 30)
+        self.assertEqual(Winner.objects.filter(giveaway=self.giveaway).count(), 30)
+
+        success, _ = perform_giveaway_draw(self.giveaway.pk)
+        self.assertFalse(success)
+
+        # Сброс в админке (победители удалены, розыгрыш открыт) - повторный розыгрыш с новым аудитом
+        seed = DrawAudit.objects.get(giveaway=self.giveaway).seed
+        Winner.objects.filter(giveaway=self.giveaway).delete()
+        Giveaway.objects.filter(pk=self.giveaway.pk).update(is_active=True)
+        success, result = perform_giveaway_draw(self.giveaway.pk)
+        self.assertTrue(success, result)
+        self.assertNotEqual(DrawAudit.objects.get(giveaway=self.giveaway).seed, seed)
+        self.assertTrue(verify_draw(self.giveaway.pk)['verified'])
+
+    def test_tiers_are_filled_in_draw_order(self):
+        PrizeTier.objects.create(giveaway=self.giveaway, position=1, name='Главный приз', winners_count=1)
+        PrizeTier.objects.create(giveaway=self.giveaway, position=2, name='Второй приз', winners_count=5)
+
+        success, result = perform_giveaway_draw(self.giveaway.pk)
+        self.assertTrue(success)
+        self.assertEqual(result['winners_count'], 6)
+        tiers = Winner.objects.filter(giveaway=self.giveaway).order_by('id').values_list('tier__name', flat=True)
+        self.assertEqual(list(tiers), ['Главный приз'] + ['Второй приз'] * 5)
+
+    def test_weighted_keys_prefer_heavy_entries(self):
+        rng = random.Random(0)
+        rows = [(1, 1000)] + [(i, 1) for i in range(2, 1001)]
+        hits = sum(largest_keys(rng.getrandbits(63), [rows], 1)[0][1] == 1 for _ in range(1000))
+        # Вероятность вытянуть тяжелую запись первой - 1000 / 1999
+        self.assertAlmostEqual(hits / 1000, 0.5, delta=0.06)
+
+    def test_zero_weight_is_rejected(self):
+        participant = Participant.objects.filter(giveaway=self.giveaway).first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Participant.objects.filter(pk=participant.pk).update(weight=0)
+
+    @skipUnless(draw.numpy is not None, 'numpy не установлен')
+    def test_numpy_keys_equal_pure_python_keys(self):
+        rng = random.Random(1)
+        ids = [rng.randrange(1, 2 ** 62) for _ in range(20000)]
+        weights = [rng.randrange(1, 100) for _ in ids]
+        seed = rng.getrandbits(63)
+        # Победители не должны зависеть от того, установлен ли numpy
+        numpy_keys = draw._draw_keys_numpy(seed, draw.numpy.array(ids), draw.numpy.array(weights)).tolist()
+        self.assertEqual(numpy_keys, draw_keys(seed, ids, weights))
+        rows = list(zip(ids, weights))
+        with mock.patch.object(draw, 'numpy', None):
+            expected = largest_keys(seed, [rows], 50)
+        self.assertEqual(largest_keys(seed, [rows], 50), expected)
+
+    def test_draw_is_verifiable(self):
+        success, _ = perform_giveaway_draw(self.giveaway.pk)
+        self.assertTrue(success)
+        audit = DrawAudit.objects.get(giveaway=self.giveaway)
+        winners = Winner.objects.filter(giveaway=self.giveaway).order_by('id').values_list('participant_id', flat=True)
+        self.assertEqual(audit.winner_ids, list(winners))
+        self.assertEqual(audit.participants_count, 100)
+
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        response = client.get(f'/api/giveaways/{self.giveaway.pk}/verify/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['verified'])
+
+        # Повторная проверка - из кеша, без прохода по участникам
+        with self.assertNumQueries(0):
+            self.assertTrue(client.get(f'/api/giveaways/{self.giveaway.pk}/verify/').data['verified'])
+        self.assertEqual(client.get('/api/giveaways/abc/verify/').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertTrue(client.get(f'/api/giveaways/0{self.giveaway.pk}/verify/').data['verified'])
+
+        # Изменение набора участников после розыгрыша обнаруживается
+        with self.captureOnCommitCallbacks(execute=True):
+            Participant.objects.filter(giveaway=self.giveaway).exclude(id__in=audit.winner_ids).first().delete()
+        report = verify_draw(self.giveaway.pk)
+        self.assertFalse(report['verified'])
+        self.assertFalse(report['digest_matches'])
+        self.assertFalse(client.get(f'/api/giveaways/{self.giveaway.pk}/verify/').data['verified'])
+        self.assertFalse(client.get(f'/api/giveaways/0{self.giveaway.pk}/verify/').data['verified'])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'verify_ip': '1/min'}})
+    def test_verify_is_throttled_per_ip(self):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        self.assertEqual(client.get(f'/api/giveaways/{self.giveaway.pk}/verify/').status_code, 404)
+        self.assertEqual(client.get(f'/api/giveaways/{self.giveaway.pk}/verify/').status_code, 429)
+
+
+class ShardedDrawTests(TestCase):
+    def setUp(self):
+        organizer = User.objects.create_user('organizer')
+        self.giveaway = make_giveaway(organizer, winners_count=10, draw_time=timezone.now() - timedelta(minutes=1))
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(200))
+        Participant.objects.bulk_create(Participant(user=user, giveaway=self.giveaway) for user in users)
+        self.giveaway.refresh_from_db()
+
+    def test_winners_do_not_depend_on_shard_count(self):
+        ids = list(Participant.objects.filter(giveaway=self.giveaway).values_list('id', flat=True))
+        # При равных весах порядок ключей совпадает с порядком хешей
+        expected = sorted(ids, key=lambda participant_id: splitmix64(42 ^ participant_id), reverse=True)[:10]
+        self.assertEqual(len(set(draw_keys(42, ids, [1] * len(ids)))), len(ids))
+
+        single = merge_shards([sample_shard(self.giveaway.pk, 42, 10, min(ids), max(ids) + 1)], 10)
+        self.assertEqual(single, expected)
+
+        # Eager-режим: chord выполняется синхронно
+        sharded_giveaway_draw.apply(args=(self.giveaway.pk,), kwargs={'seed': 42, 'shard_size': 30}).get()
+        winners = list(Winner.objects.filter(giveaway=self.giveaway).order_by('id').values_list('participant_id', flat=True))
+        self.assertEqual(winners, expected)
+        self.giveaway.refresh_from_db()
+        self.assertFalse(self.giveaway.is_active)
+        self.assertTrue(verify_draw(self.giveaway.pk)['verified'])
+
+    def test_changes_after_sampling_trigger_resample(self):
+        # Досрочный розыгрыш: вступления еще открыты
+        Giveaway.objects.filter(pk=self.giveaway.pk).update(draw_time=timezone.now() + timedelta(minutes=1))
+        snapshot = participants_snapshot(self.giveaway.pk)
+        shard = sample_shard(self.giveaway.pk, 42, 10, 0, 10 ** 9)
+        for i in range(30):
+            join_giveaway(self.giveaway.pk, User.objects.create_user(f'late{i}'))
+        Participant.objects.filter(pk=shard[0][1]).delete()
+
+        # Reduce видит расхождение и (в eager-режиме сразу) пересчитывает шарды
+        finish_sharded_draw([shard], self.giveaway.pk, 10, 42, snapshot)
+        report = verify_draw(self.giveaway.pk)
+        self.assertTrue(report['verified'])
+        self.assertEqual(report['participants_count'], 229)
+        self.assertEqual(len(report['winner_ids']), 10)
+
+    def test_buffered_joins_are_flushed_before_sampling(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        previous, join_buffer._buffer = join_buffer._buffer, join_buffer.LocalJoinBuffer(directory.name, fsync=False)
+        self.addCleanup(setattr, join_buffer, '_buffer', previous)
+        Giveaway.objects.filter(pk=self.giveaway.pk).update(buffered_joins=True, draw_time=timezone.now() + timedelta(minutes=1))
+        late = User.objects.create_user('late')
+        self.assertEqual(buffered_join(self.giveaway.pk, late), JOIN_QUEUED)
+
+        # Готовая выборка не видела вступления из буфера - розыгрыш не проводится
+        success, result = perform_giveaway_draw(self.giveaway.pk, check_draw_time=False, winner_ids=[], seed=42)
+        self.assertEqual((success, result), (False, DRAW_SAMPLE_STALE))
+        self.assertTrue(Participant.objects.filter(giveaway=self.giveaway, user=late).exists())
+
+        buffered_join(self.giveaway.pk, User.objects.create_user('later'))
+        sharded_giveaway_draw.apply(args=(self.giveaway.pk,), kwargs={'seed': 42, 'shard_size': 30}).get()
+        report = verify_draw(self.giveaway.pk)
+        self.assertTrue(report['verified'])
+        self.assertEqual(DrawAudit.objects.get(giveaway=self.giveaway).participants_count, 202)
+
+
+class SchedulerTests(TestCase):
+    def test_due_giveaways_are_claimed_once(self):
+        organizer = User.objects.create_user('organizer')
+        user = User.objects.create_user('player')
+        past = timezone.now() - timedelta(minutes=1)
+        due = [make_giveaway(organizer, draw_time=past) for _ in range(3)]
+        make_giveaway(organizer)
+        for giveaway in due:
+            Participant.objects.create(user=user, giveaway=giveaway)
+
+        now = timezone.now()
+        self.assertEqual(sorted(claim_due_giveaways(now, limit=2)), [due[0].pk, due[1].pk])
+        self.assertEqual(claim_due_giveaways(now, limit=2), [due[2].pk])
+        # Параллельный тик ничего не получает
+        self.assertEqual(claim_due_giveaways(now), [])
+
+        Giveaway.objects.update(draw_dispatched_at=None)
+        check_scheduled_giveaways()
+        self.assertEqual(Winner.objects.count(), 3)
+        self.assertFalse(Giveaway.objects.filter(pk__in=[g.pk for g in due], is_active=True).exists())
+
+
+class BulkEnrollTests(TestCase):
+    def test_enroll_reports_accepted_duplicates_and_rejected(self):
+        organizer = User.objects.create_user('organizer')
+        giveaway = make_giveaway(organizer, max_participants=4)
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(5))
+        Participant.objects.create(user=users[0], giveaway=giveaway)
+
+        client = APIClient()
+        client.force_authenticate(organizer)
+        response = client.post(
+            f'/api/giveaways/{giveaway.pk}/enroll/',
+            {'user_ids': [user.pk for user in users], 'usernames': ['user1', 'ghost']},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['accepted'], 3)
+        # user0 уже участвует, user1 указан дважды
+        self.assertEqual(response.data['duplicates'], 2)
+        self.assertEqual(response.data['rejected_reasons'], {'unknown_user': 1, 'full': 1, 'closed': 0})
+        self.assertEqual(response.data['rejected'], 2)
+
+        giveaway.refresh_from_db()
+        self.assertEqual(giveaway.participants_count, 4)
+        self.assertEqual(giveaway.participants.count(), 4)
+
+        self.assertEqual(client.post('/api/giveaways/abc/enroll/', {'user_ids': [1]}, format='json').status_code, 404)
+
+
+@override_settings(JOIN_BUFFER_FLUSH_INTERVAL=0)
+class BufferedJoinTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.buffer = join_buffer.LocalJoinBuffer(self.directory.name, fsync=False)
+        self._previous, join_buffer._buffer = join_buffer._buffer, self.buffer
+        self.addCleanup(setattr, join_buffer, '_buffer', self._previous)
+
+        self.organizer = User.objects.create_user('organizer')
+        self.giveaway = make_giveaway(self.organizer, buffered_joins=True, max_participants=2)
+
+    def test_joins_are_acknowledged_then_flushed(self):
+        client = APIClient()
+        for username in ('a', 'b', 'c'):
+            client.force_authenticate(User.objects.create_user(username))
+            response = client.post(f'/api/giveaways/{self.giveaway.pk}/enter/')
+            expected = 400 if username == 'c' else 202
+            self.assertEqual(response.status_code, expected)
+        self.assertEqual(client.post(f'/api/giveaways/{self.giveaway.pk}/enter/').data['status'], JOIN_FULL)
+        self.assertFalse(Participant.objects.exists())
+
+        # Журнал переживает процесс: новый буфер подхватывает вступления
+        recovered = join_buffer.LocalJoinBuffer(self.directory.name, fsync=False)
+        self.assertEqual(recovered.pending(self.giveaway.pk, 10), list(
+            User.objects.filter(username__in=['a', 'b']).order_by('id').values_list('id', flat=True)
+        ))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_buffered_joins(self.giveaway.pk), 2)
+        self.giveaway.refresh_from_db()
+        self.assertEqual(self.giveaway.participants_count, 2)
+        self.assertEqual(self.buffer.pending_count(self.giveaway.pk), 0)
+
+    def test_draw_flushes_pending_joins(self):
+        user = User.objects.create_user('player')
+        self.assertEqual(buffered_join(self.giveaway.pk, user), JOIN_QUEUED)
+
+        success, result = perform_giveaway_draw(self.giveaway.pk, check_draw_time=False)
+        self.assertTrue(success)
+        self.assertEqual(result['winners'][0]['id'], user.id)
+
+    def test_failed_draw_keeps_flushed_joins_in_buffer(self):
+        user = User.objects.create_user('player')
+        buffered_join(self.giveaway.pk, user)
+
+        # Откат розыгрыша откатывает и записанных участников - буфер их не теряет
+        with mock.patch.object(DrawAudit.objects, 'create', side_effect=IntegrityError('audit')):
+            with self.captureOnCommitCallbacks(execute=True):
+                success, _ = perform_giveaway_draw(self.giveaway.pk, check_draw_time=False)
+        self.assertFalse(success)
+        self.assertFalse(Participant.objects.exists())
+        self.assertEqual(self.buffer.pending(self.giveaway.pk, 10), [user.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            success, _ = perform_giveaway_draw(self.giveaway.pk, check_draw_time=False)
+        self.assertTrue(success)
+        self.assertEqual(self.buffer.pending_count(self.giveaway.pk), 0)
+
+    async def test_async_enter_queues_join(self):
+        user = await User.objects.acreate(username='player')
+        token = await Token.objects.acreate(user=user)
+        response = await AsyncClient().post(
+            f'/api/async/giveaways/{self.giveaway.pk}/enter/', headers={'Authorization': f'Token {token.key}'}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], JOIN_QUEUED)
+        self.assertEqual(self.buffer.pending(self.giveaway.pk, 10), [user.id])
+        self.assertFalse(await Participant.objects.aexists())
+
+    def test_draws_survive_redis_outage(self):
+        class RedisError(Exception):
+            pass
+
+        refused = RedisError('connection refused')
+        buffer = join_buffer.RedisJoinBuffer.__new__(join_buffer.RedisJoinBuffer)
+        buffer.fallback = self.buffer
+        buffer.client = mock.Mock(**{f'{name}.side_effect': refused for name in ('lrange', 'delete', 'sismember', 'llen')})
+        buffer._add = buffer._ack = mock.Mock(side_effect=refused)
+        join_buffer._buffer = buffer
+        plain = make_giveaway(self.organizer)
+        Participant.objects.create(user=User.objects.create_user('plain'), giveaway=plain)
+
+        with mock.patch.object(join_buffer, 'redis', mock.Mock(RedisError=RedisError)):
+            # Обычный розыгрыш буфер не трогает
+            success, _ = perform_giveaway_draw(plain.pk, check_draw_time=False)
+            self.assertTrue(success)
+            self.assertFalse(buffer.client.method_calls)
+
+            # Вступление уходит в локальный буфер, очередь Redis пропускается до восстановления
+            user = User.objects.create_user('player')
+            self.assertEqual(buffered_join(self.giveaway.pk, user), JOIN_QUEUED)
+            with self.captureOnCommitCallbacks(execute=True):
+                success, result = perform_giveaway_draw(self.giveaway.pk, check_draw_time=False)
+            self.assertTrue(success, result)
+            self.assertEqual(result['winners'][0]['id'], user.id)
+
+    def _journal_of(self, pid, user):
+        with open(os.path.join(self.directory.name, f'joins-{pid}.log'), 'w', encoding='utf-8') as journal:
+            journal.write(f'{self.giveaway.pk} {user.id}\n')
+
+    def test_draw_waits_for_joins_of_live_processes(self):
+        user = User.objects.create_user('player')
+        self._journal_of(os.getppid(), user)
+        Giveaway.objects.filter(pk=self.giveaway.pk).update(draw_dispatched_at=timezone.now())
+
+        # Записать вступление может только его процесс: розыгрыш откладывается до следующего тика
+        self.assertEqual(schedule_giveaway_draw(self.giveaway.pk), DRAW_JOINS_PENDING)
+        self.giveaway.refresh_from_db()
+        self.assertTrue(self.giveaway.is_active)
+        self.assertIsNone(self.giveaway.draw_dispatched_at)
+
+    def test_journal_of_dead_process_is_flushed_before_draw(self):
+        user = User.objects.create_user('player')
+        finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        self._journal_of(int(finished.stdout), user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            success, result = perform_giveaway_draw(self.giveaway.pk, check_draw_time=False)
+        self.assertTrue(success)
+        self.assertEqual(result['winners'][0]['id'], user.id)
+        self.assertEqual(os.listdir(self.directory.name), [f'joins-{os.getpid()}.log'])
+
+
+class SyncParticipantsCountTests(TestCase):
+    def sync(self, *args):
+        out = StringIO()
+        call_command('sync_participants_count', *args, stdout=out)
+        return out.getvalue()
+
+    def test_drift_is_reported_and_fixed(self):
+        organizer = User.objects.create_user('organizer')
+        drifted, clean = make_giveaway(organizer), make_giveaway(organizer)
+        for giveaway in (drifted, clean):
+            join_giveaway(giveaway.pk, User.objects.create_user(f'player{giveaway.pk}'))
+        # Например, процесс упал между резервом места и компенсирующим UPDATE
+        Giveaway.objects.filter(pk=drifted.pk).update(participants_count=5)
+
+        output = self.sync('--dry-run')
+        self.assertIn(f'Розыгрыш {drifted.pk}: сохранено 5, фактически 1', output)
+        self.assertIn('Найдено расхождений: 1', output)
+        self.assertNotIn(f'Розыгрыш {clean.pk}:', output)
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.participants_count, 5)
+
+        self.assertIn('Расхождений не найдено', self.sync('--giveaway', str(clean.pk)))
+        self.assertIn('Исправлено счетчиков: 1', self.sync())
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.participants_count, 1)
+        self.assertIn('Расхождений не найдено', self.sync())
+
+
+class CascadeDeleteTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer')
+        self.giveaway = make_giveaway(self.organizer, winners_count=20)
+        self.users = User.objects.bulk_create(User(username=f'user{i}') for i in range(200))
+        Participant.objects.bulk_create(Participant(user=user, giveaway=self.giveaway) for user in self.users)
+        Giveaway.objects.filter(pk=self.giveaway.pk).update(participants_count=200)
+
+    def test_giveaway_delete_does_not_run_per_row_statements(self):
+        perform_giveaway_draw(self.giveaway.pk, check_draw_time=False)
+        # SAVEPOINT, выборки каскада пачками, DELETE по таблицам, RELEASE - без UPDATE и SELECT на строку
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(10):
+            self.giveaway.delete()
+        self.assertLessEqual(len(callbacks), 3)
+        self.assertFalse(Participant.objects.exists())
+
+    def test_user_delete_releases_seats(self):
+        other = make_giveaway(self.organizer)
+        join_giveaway(other.pk, self.users[0])
+        self.users[0].delete()
+        for giveaway in (self.giveaway, other):
+            giveaway.refresh_from_db()
+        self.assertEqual(self.giveaway.participants_count, 199)
+        self.assertEqual(other.participants_count, 0)
+
+
+class ConcurrentJoinTests(TransactionTestCase):
+    threads = 40
+    capacity = 15
+
+    def test_capacity_is_never_exceeded(self):
+        organizer = User.objects.create_user('organizer')
+        users = [User.objects.create_user(f'user{i}') for i in range(self.threads)]
+        giveaway = make_giveaway(organizer, max_participants=self.capacity)
+
+        barrier = threading.Barrier(self.threads)
+        results = []
+        errors = []
+
+        def worker(user):
+            try:
+                barrier.wait()
+                # Каждый пользователь стучится дважды, чтобы проверить и дубликаты
+                for _ in range(2):
+                    results.append(join_giveaway(giveaway.pk, user))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        giveaway.refresh_from_db()
+        joined = Participant.objects.filter(giveaway=giveaway).count()
+        self.assertEqual(results.count(JOIN_OK), joined)
+        self.assertEqual(joined, self.capacity)
+        self.assertEqual(giveaway.participants_count, joined)
+        self.assertEqual(set(results) - {JOIN_OK, JOIN_ALREADY_JOINED, JOIN_FULL}, set())
+
+
+class ShardedDrawWorkerTests(TransactionTestCase):
+    """Chord шардированного розыгрыша через брокер и result backend, как в продакшене"""
+    celery_settings = {
+        'CELERY_TASK_ALWAYS_EAGER': False,
+        'CELERY_BROKER_URL': 'memory://',
+        'CELERY_RESULT_BACKEND': 'cache+memory://',
+    }
+
+    def setUp(self):
+        previous = {key: app.conf[key] for key in self.celery_settings}
+        app.conf.update(self.celery_settings)
+        self.addCleanup(app.conf.update, previous)
+        # Пулы соединений, созданные delay() в eager-тестах, помнят прежний брокер
+        self.reset_pools()
+        self.addCleanup(self.reset_pools)
+
+    def reset_pools(self):
+        app._pool = None
+        app.amqp._producer_pool = None
+
+    def test_chord_runs_on_worker(self):
+        organizer = User.objects.create_user('organizer')
+        giveaway = make_giveaway(organizer, winners_count=10, draw_time=timezone.now() - timedelta(minutes=1))
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(200))
+        Participant.objects.bulk_create(Participant(user=user, giveaway=giveaway) for user in users)
+        Giveaway.objects.filter(pk=giveaway.pk).update(participants_count=200)
+
+        self.assertFalse(app.conf.task_always_eager)
+        with start_worker(app, pool='solo', perform_ping_check=False):
+            sharded_giveaway_draw.delay(giveaway.pk, seed=42, shard_size=30)
+            # Reduce chord выполняется отдельной задачей после всех 7 шардов
+            deadline = time.monotonic() + 10
+            while Giveaway.objects.filter(pk=giveaway.pk, is_active=True).exists() and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        self.assertEqual(Winner.objects.filter(giveaway=giveaway).count(), 10)
+        self.assertTrue(verify_draw(giveaway.pk)['verified'])
@@ -0,0 +1,266 @@
+# throttling.py
+"""
+Ограничение частоты запросов корзиной токенов (token bucket).
+
+Корзина вмещает N токенов и пополняется со скоростью N за период из
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] ('30/min'): разрешен всплеск до N
+запросов, дальше - не чаще заданной скорости. Состояние корзин - в памяти
+процесса или в Redis (THROTTLE_REDIS_URL), общем для всех воркеров; при
+ошибке Redis проверка идет по локальным корзинам.
+
+Троттлы по IP и по розыгрышу не зависят от пользователя и в представлениях
+с ThrottleFirstMixin проверяются до аутентификации, то есть до любых
+запросов к БД и хеширования паролей.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import giveaway_pk
+
+try:
+    import redis
+except ImportError:  # без redis работают только локальные корзины
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60): емкость корзины и период ее полного пополнения, с"""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """Корзины в памяти процесса, самые давние вытесняются сверх maxsize"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (токенов, время пополнения)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        """Забирает токен; возвращает 0 или секунды до появления следующего токена"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Пополнение и списание одной операцией; время - часы Redis, общие для воркеров
+_CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Корзины в Redis; ключ живет, пока корзина не наполнится заново"""
+
+    def __init__(self, url, fallback):
+        self.client = redis.Redis.from_url(url)
+        self.fallback = fallback
+        self._consume = self.client.register_script(_CONSUME_SCRIPT)
+
+    def consume(self, key, capacity, refill_rate):
+        try:
+            return float(self._consume(keys=[f'throttle:{key}'], args=[capacity, refill_rate]))
+        except redis.RedisError as exc:
+            logger.warning(f"Redis недоступен, троттлинг по локальным корзинам: {exc}")
+            return self.fallback.consume(key, capacity, refill_rate)
+
+    def clear(self):
+        self.fallback.clear()
+
+
+class ThrottleStats:
+    """Счетчики пропущенных и отклоненных запросов по scope"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, scope, allowed):
+        key = (scope, 'allowed' if allowed else 'throttled')
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        scopes = sorted({scope for scope, _ in counts})
+        return {
+            scope: {
+                'allowed': counts.get((scope, 'allowed'), 0),
+                'throttled': counts.get((scope, 'throttled'), 0),
+            }
+            for scope in scopes
+        }
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+throttle_stats = ThrottleStats()
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """Хранилище корзин процесса, создается при первом обращении"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            local = LocalBucketStore(getattr(settings, 'THROTTLE_LOCAL_MAXSIZE', 100000))
+            url = getattr(settings, 'THROTTLE_REDIS_URL', None)
+            if url and redis is not None:
+                _store = RedisBucketStore(url, fallback=local)
+            else:
+                _store = local
+        return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Базовый троттл: подклассы задают scope и get_ident_key(); запрос без
+    ключа (None) не ограничивается. Скорость без записи в
+    DEFAULT_THROTTLE_RATES (или None) отключает троттл.
+    """
+    scope = None
+    before_authentication = False
+
+    def __init__(self):
+        self.wait_seconds = None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            self.capacity = None
+        else:
+            self.capacity, period = parse_rate(rate)
+            self.refill_rate = self.capacity / period
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.capacity is None:
+            return True
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+        self.wait_seconds = get_bucket_store().consume(f'{self.scope}:{ident}', self.capacity, self.refill_rate)
+        allowed = self.wait_seconds == 0
+        throttle_stats.record(self.scope, allowed)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    """По адресу клиента (учитывает NUM_PROXIES)"""
+    before_authentication = True
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UserThrottle(TokenBucketThrottle):
+    """По пользователю; анонимные запросы не ограничивает"""
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class GiveawayThrottle(TokenBucketThrottle):
+    """Общий лимит на розыгрыш по всем пользователям: по pk из URL или join_code"""
+    before_authentication = True
+
+    def get_ident_key(self, request, view):
+        pk = view.kwargs.get('pk')
+        if pk is not None:
+            return giveaway_pk(pk)  # '01' и '1' - одна корзина
+        join_code = request.data.get('join_code') if hasattr(request.data, 'get') else None
+        return f'code:{join_code}' if join_code else None
+
+
+class JoinIPThrottle(IPThrottle):
+    scope = 'join_ip'
+
+
+class JoinUserThrottle(UserThrottle):
+    scope = 'join_user'
+
+
+class JoinGiveawayThrottle(GiveawayThrottle):
+    scope = 'join_giveaway'
+
+
+class VerifyIPThrottle(IPThrottle):
+    """Проверка розыгрыша: промах кеша - проход по всем участникам"""
+    scope = 'verify_ip'
+
+
+class AuthIPThrottle(IPThrottle):
+    """Вход и регистрация: каждая попытка - хеширование пароля"""
+    scope = 'auth_ip'
+
+
+class ThrottleFirstMixin:
+    """
+    Троттлы с before_authentication=True проверяются в начале initial(),
+    до аутентификации и проверки прав; остальные - на обычном месте DRF.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        self._check_throttles(request, before_authentication=True)
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        self._check_throttles(request, before_authentication=False)
+
+    def _check_throttles(self, request, before_authentication):
+        durations = [
+            throttle.wait()
+            for throttle in self.get_throttles()
+            if getattr(throttle, 'before_authentication', False) == before_authentication
+            and not throttle.allow_request(request, self)
+        ]
+        if durations:
+            self.throttled(request, max(durations))
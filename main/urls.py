@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import GiveawayViewSet, MyParticipationsViewSet, CustomAuthToken, UserRegistrationView
+from .views import GiveawayViewSet, MyParticipationsViewSet, CustomAuthToken, UserRegistrationView, cache_stats, metrics
 from django.http import JsonResponse
+from . import async_views
 
 def api_root(request):
     """Простая корневая страница API"""
@@ -25,4 +26,13 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/register/', UserRegistrationView.as_view(), name='register'),
     path('auth/token/', CustomAuthToken.as_view(), name='api_token_auth'),
+    path('cache-stats/', cache_stats, name='cache-stats'),
+    path('metrics/', metrics, name='metrics'),
+    
+    # Асинхронные варианты для ASGI
+    path('async/giveaways/<int:pk>/', async_views.giveaway_detail, name='async-giveaway-detail'),
+    path('async/giveaways/<int:pk>/enter/', async_views.giveaway_enter, name='async-giveaway-enter'),
+    path('async/giveaways/<int:pk>/participants/', async_views.giveaway_participants, name='async-giveaway-participants'),
+    path('async/giveaways/<int:pk>/winners/', async_views.giveaway_winners, name='async-giveaway-winners'),
+    path('async/auth/register/', async_views.register, name='async-register'),
 ]
\ No newline at end of file
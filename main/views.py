@@ -3,10 +3,24 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.utils import timezone
-from .models import Giveaway, Participant, Winner
-from .serializers import GiveawaySerializer, ParticipantSerializer, WinnerSerializer
-from .tasks import schedule_giveaway_draw
+from .models import DrawAudit, Giveaway
+from .serializers import GiveawaySerializer, ParticipantSerializer, WinnerSerializer, BulkEnrollSerializer
+from .pagination import GiveawayCursorPagination, IndexCursorPagination, ParticipantCursorPagination, WinnerCursorPagination
+from .tasks import flush_join_buffer, schedule_giveaway_draw
+from .services import (
+    bulk_enroll, join_buffer_needs_flush, join_by_code, join_giveaway, verify_draw, JOIN_OK, JOIN_QUEUED, JOIN_ALREADY_JOINED, JOIN_FULL, JOIN_CLOSED, JOIN_NOT_FOUND,
+)
+from rest_framework.exceptions import NotFound
+from django.http import HttpResponse, StreamingHttpResponse
+from .metrics import registry, render_counters
+from .exports import EXPORT_CONTENT_TYPES, EXPORT_DATASETS, EXPORT_WRITERS
+from .authentication import token_cache
+from .throttling import (
+    AuthIPThrottle, JoinGiveawayThrottle, JoinIPThrottle, JoinUserThrottle, ThrottleFirstMixin, VerifyIPThrottle, throttle_stats,
+)
+from .cache import get_cache_stats, get_draw_verification, get_giveaway_data, get_giveaways_data, get_participation_index, giveaway_pk, get_list_page, serialize_shared, with_user_fields
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
@@ -17,20 +31,29 @@ from django.contrib.auth.models import User
 from .serializers import UserRegistrationSerializer
 
 
-class UserRegistrationView(generics.CreateAPIView):
+JOIN_ERRORS = {
+    JOIN_ALREADY_JOINED: 'Вы уже участвуете в этом розыгрыше',
+    JOIN_FULL: 'Достигнуто максимальное количество участников',
+    JOIN_CLOSED: 'Регистрация на розыгрыш завершена',
+}
+
+
+JOIN_THROTTLES = [JoinIPThrottle, JoinGiveawayThrottle, JoinUserThrottle]
+
+
+class UserRegistrationView(ThrottleFirstMixin, generics.CreateAPIView):
     """Регистрация нового пользователя"""
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
+    authentication_classes = []  # ни сессии, ни токена: до троттлинга нет запросов к БД
     permission_classes = []  # Разрешаем доступ без аутентификации
+    throttle_classes = [AuthIPThrottle]
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        
-        # Создаем токен для нового пользователя
-        from rest_framework.authtoken.models import Token
-        token, created = Token.objects.get_or_create(user=user)
+        token = user.auth_token  # создан в той же транзакции, что и пользователь
         
         return Response({
             'token': token.key,
@@ -41,7 +64,10 @@ class UserRegistrationView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
     
 
-class CustomAuthToken(ObtainAuthToken):
+class CustomAuthToken(ThrottleFirstMixin, ObtainAuthToken):
+    authentication_classes = []
+    throttle_classes = [AuthIPThrottle]
+
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data,
                                            context={'request': request})
@@ -56,55 +82,103 @@ class CustomAuthToken(ObtainAuthToken):
         })
     
     
-class GiveawayViewSet(viewsets.ModelViewSet):
+class GiveawayViewSet(ThrottleFirstMixin, viewsets.ModelViewSet):
     serializer_class = GiveawaySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = GiveawayCursorPagination
     
     # ДОБАВЬТЕ ЭТОТ АТРИБУТ:
     queryset = Giveaway.objects.all()
     
     def get_queryset(self):
         # Организаторы видят свои розыгрыши, игроки - активные
+        queryset = Giveaway.objects.with_user_flags(self.request.user)
         if self.request.query_params.get('my_giveaways'):
-            return Giveaway.objects.filter(created_by=self.request.user)
-        return Giveaway.objects.filter(is_active=True)
+            return queryset.filter(created_by=self.request.user)
+        return queryset.filter(is_active=True)
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
-    @action(detail=True, methods=['post'])
+    def retrieve(self, request, *args, **kwargs):
+        """Карточка розыгрыша из кеша, пользовательские поля - отдельно"""
+        data = get_giveaway_data(kwargs[self.lookup_field])
+        if data is None:
+            raise NotFound()
+        
+        # Те же правила видимости, что и в get_queryset
+        if request.query_params.get('my_giveaways'):
+            visible = data['created_by']['id'] == request.user.id
+        else:
+            visible = data['is_active']
+        if not visible:
+            raise NotFound()
+        
+        return Response(with_user_fields([data], request.user)[0])
+    
+    def list(self, request, *args, **kwargs):
+        """Лента активных розыгрышей из кеша; свои розыгрыши - напрямую из БД"""
+        if request.query_params.get('my_giveaways'):
+            return super().list(request, *args, **kwargs)
+        
+        def build_page():
+            queryset = Giveaway.objects.with_user_flags(None).filter(is_active=True)
+            page = self.paginate_queryset(queryset)
+            return {
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+                'results': [serialize_shared(giveaway) for giveaway in page],
+            }
+        
+        page = get_list_page(request.build_absolute_uri(), build_page)
+        return Response({**page, 'results': with_user_fields(page['results'], request.user)})
+    
+    def paginated_response(self, queryset, pagination_class, serializer_class):
+        """Постраничная выдача для вложенных списков (участники, победители)"""
+        paginator = pagination_class()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=True, methods=['post'], throttle_classes=JOIN_THROTTLES)
     def enter(self, request, pk=None):
         """Участие в розыгрыше по коду"""
-        giveaway = self.get_object()
-        
-        # Проверки
-        if giveaway.participants.filter(user=request.user).exists():
+        return self._join_response(join_giveaway(pk, request.user), giveaway_pk(pk))
+    
+    @action(detail=False, methods=['post'], url_path='join-by-code', throttle_classes=JOIN_THROTTLES)
+    def join_by_code(self, request):
+        """Участие в розыгрыше по join_code без ID розыгрыша"""
+        join_code = str(request.data.get('join_code', '')).strip()
+        if not join_code or len(join_code) > Giveaway._meta.get_field('join_code').max_length:
             return Response(
-                {'error': 'Вы уже участвуете в этом розыгрыше'}, 
+                {'error': 'Укажите корректный join_code'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        if giveaway.max_participants and giveaway.participants.count() >= giveaway.max_participants:
+        giveaway_id, result = join_by_code(join_code, request.user)
+        return self._join_response(result, giveaway_id, {'giveaway': giveaway_id})
+    
+    def _join_response(self, result, giveaway_id, extra=None):
+        extra = extra or {}
+        if result == JOIN_QUEUED:
+            if join_buffer_needs_flush(giveaway_id):
+                flush_join_buffer.delay(giveaway_id)
             return Response(
-                {'error': 'Достигнуто максимальное количество участников'}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {'message': 'Заявка на участие принята!', 'status': result, **extra},
+                status=status.HTTP_202_ACCEPTED
             )
         
-        if giveaway.draw_time < timezone.now():
+        if result == JOIN_OK:
             return Response(
-                {'error': 'Регистрация на розыгрыш завершена'}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {'message': 'Вы успешно зарегистрированы в розыгрыше!', 'status': result, **extra},
+                status=status.HTTP_201_CREATED
             )
         
-        # Создание участника
-        participant = Participant.objects.create(
-            user=request.user,
-            giveaway=giveaway
-        )
+        if result == JOIN_NOT_FOUND:
+            raise NotFound()
         
         return Response(
-            {'message': 'Вы успешно зарегистрированы в розыгрыше!'},
-            status=status.HTTP_201_CREATED
+            {'error': JOIN_ERRORS[result], 'status': result, **extra},
+            status=status.HTTP_400_BAD_REQUEST
         )
     
     @action(detail=True, methods=['post'])
@@ -130,30 +204,136 @@ class GiveawayViewSet(viewsets.ModelViewSet):
     def participants(self, request, pk=None):
         """Список участников розыгрыша"""
         giveaway = self.get_object()
-        participants = giveaway.participants.all()
-        serializer = ParticipantSerializer(participants, many=True)
-        return Response(serializer.data)
+        participants = giveaway.participants.select_related('user')
+        return self.paginated_response(participants, ParticipantCursorPagination, ParticipantSerializer)
     
     @action(detail=True, methods=['get'])
     def winners(self, request, pk=None):
         """Список победителей розыгрыша"""
         giveaway = self.get_object()
-        winners = giveaway.winners.all()
-        serializer = WinnerSerializer(winners, many=True)
-        return Response(serializer.data)
+        winners = giveaway.winners.select_related('participant__user')
+        return self.paginated_response(winners, WinnerCursorPagination, WinnerSerializer)
+
+    @action(detail=True, methods=['get'], throttle_classes=[VerifyIPThrottle])
+    def verify(self, request, pk=None):
+        """Проверка проведенного розыгрыша по сохраненному seed (доступна всем)"""
+        try:
+            report = get_draw_verification(pk, verify_draw)
+        except DrawAudit.DoesNotExist:
+            raise NotFound('Розыгрыш еще не проведен')
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def enroll(self, request, pk=None):
+        """Массовая регистрация участников (только для организатора)"""
+        giveaway = generics.get_object_or_404(Giveaway.objects.only('id', 'created_by'), pk=pk)
+        
+        if giveaway.created_by_id != request.user.id:
+            return Response(
+                {'error': 'Только организатор может регистрировать участников'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = BulkEnrollSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = bulk_enroll(giveaway.id, **serializer.validated_data)
+        return Response(report, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Потоковая выгрузка участников или победителей (только для организатора)"""
+        giveaway = generics.get_object_or_404(Giveaway.objects.only('id', 'created_by'), pk=pk)
+        
+        if giveaway.created_by_id != request.user.id:
+            return Response(
+                {'error': 'Только организатор может выгружать данные розыгрыша'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        dataset = request.query_params.get('dataset', 'participants')
+        export_format = request.query_params.get('export_format', 'csv')
+        if dataset not in EXPORT_DATASETS or export_format not in EXPORT_WRITERS:
+            return Response(
+                {'error': 'Неизвестный набор данных или формат выгрузки'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        response = StreamingHttpResponse(
+            EXPORT_WRITERS[export_format](dataset, giveaway.id),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="giveaway-{giveaway.id}-{dataset}.{export_format}"'
+        )
+        return response
 
 class MyParticipationsViewSet(viewsets.ReadOnlyModelViewSet):
     """Розыгрыши, в которых участвует текущий пользователь"""
     serializer_class = GiveawaySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IndexCursorPagination
     
     # ДОБАВЬТЕ И ЗДЕСЬ:
     queryset = Giveaway.objects.all()
     
     def get_queryset(self):
-        return Giveaway.objects.filter(
+        return Giveaway.objects.with_user_flags(self.request.user).filter(
             participants__user=self.request.user
         )
     
+    def list(self, request, *args, **kwargs):
+        """
+        Страница участий из кешированного индекса пользователя и карточек розыгрышей,
+        без JOIN с Participant. Порядок и курсор - как у GiveawayCursorPagination.
+        """
+        index = get_participation_index(request.user.id)
+        page_ids = self.paginator.paginate_keys(index['keys'], request)
+        won = set(index['won'])
+        results = [
+            {
+                **data,
+                'is_joined': True,
+                'is_creator': data['created_by']['id'] == request.user.id,
+                'is_winner': data['id'] in won,
+            }
+            for data in get_giveaways_data(page_ids)
+        ]
+        return self.paginator.get_paginated_response(results)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Статистика кешей (только для персонала)"""
+    return Response({**get_cache_stats(), 'token_auth': token_cache.stats(), 'throttle': throttle_stats.snapshot()})
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Метрики профилирования в текстовом формате Prometheus (только для персонала)"""
+    cache_stats = get_cache_stats()
+    token_stats = token_cache.stats()
+    body = registry.render()
+    body += render_counters(
+        'giveaway_cache_hits_total', 'Попадания в кеш',
+        {**{kind: stats['hits'] for kind, stats in cache_stats.items()}, 'token_auth': token_stats['hits']},
+        'cache',
+    )
+    body += render_counters(
+        'giveaway_cache_misses_total', 'Промахи кеша',
+        {**{kind: stats['misses'] for kind, stats in cache_stats.items()}, 'token_auth': token_stats['misses']},
+        'cache',
+    )
+    throttles = throttle_stats.snapshot()
+    body += render_counters(
+        'giveaway_throttle_allowed_total', 'Запросы, пропущенные троттлингом',
+        {scope: counts['allowed'] for scope, counts in throttles.items()},
+        'scope',
+    )
+    body += render_counters(
+        'giveaway_throttle_rejected_total', 'Запросы, отклоненные троттлингом (429)',
+        {scope: counts['throttled'] for scope, counts in throttles.items()},
+        'scope',
+    )
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')